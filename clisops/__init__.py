@@ -1,28 +1,96 @@
 # -*- coding: utf-8 -*-
 """Top-level package for clisops."""
 
+import importlib.util
 import logging
 import logging.config
 import os
-
-import dask
-from roocs_utils.config import get_config
-
-import clisops
+import warnings
+from collections.abc import Mapping
+from configparser import ConfigParser
 
 from .__version__ import __author__, __email__, __version__
 
 logging.config.fileConfig(
     os.path.join(os.path.dirname(__file__), "etc", "logging.conf")
 )
-CONFIG = get_config(clisops)
 
 
-# Set the memory limit for each dask chunk
-chunk_memory_limit = CONFIG["clisops:read"].get("chunk_memory_limit", None)
+def _config_files():
+    """Return the configuration files read by `roocs_utils.config.get_config` for clisops, in the same order."""
+    files = []
+    spec = importlib.util.find_spec("roocs_utils")
+    if spec is not None and spec.submodule_search_locations:
+        files.append(
+            os.path.join(list(spec.submodule_search_locations)[0], "etc", "roocs.ini")
+        )
+    files.append(os.path.join(os.path.dirname(__file__), "etc", "roocs.ini"))
+    files.append(os.path.join(os.sep, "etc", "roocs.ini"))
+    if "ROOCS_CONFIG" in os.environ:
+        files.extend(os.environ["ROOCS_CONFIG"].split(":"))
+    return files
+
+
+def _set_environment():
+    """Set the environment variables of the configuration, e.g. the thread limits of the BLAS libraries.
+
+    Only the environment section is parsed, without importing `roocs_utils`, so that the variables are set at
+    import, before any library, subprocess or dask worker reading them is started.
+    """
+    conf = ConfigParser()
+    conf.read(_config_files())
+    if conf.has_section("environment"):
+        for key, value in conf.items("environment"):
+            os.environ[key.upper()] = value
+
+
+_set_environment()
+
+
+class _Config(Mapping):
+    """The clisops configuration, read on first access.
+
+    Reading the configuration imports `roocs_utils`, which imports xarray, so it is deferred until a setting is
+    actually needed. Its environment variables are set at import by `_set_environment`.
+    """
+
+    def __init__(self):
+        self._config = None
+
+    def _load(self):
+        if self._config is None:
+            from roocs_utils.config import get_config
+
+            import clisops
+
+            self._config = get_config(clisops)
+
+        return self._config
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+CONFIG = _Config()
+
+
+def get_chunk_memory_limit():
+    """Return the memory limit for each dask chunk, from the configuration."""
+    return CONFIG["clisops:read"].get("chunk_memory_limit", None)
 
-# if get_chunk_mem_limit():
-#     dask.config.set({"array.chunk-size": get_chunk_mem_limit()})
 
-for key, value in CONFIG["environment"].items():
-    os.environ[key.upper()] = value
+def __getattr__(name):
+    if name == "chunk_memory_limit":
+        warnings.warn(
+            "`clisops.chunk_memory_limit` is deprecated, use `clisops.get_chunk_memory_limit()` instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return get_chunk_memory_limit()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,3 +1,5 @@
+from .average import average_over_dims
+from .regions import aggregate_regions
 from .subset import (
     create_mask,
     subset_bbox,
@@ -0,0 +1,176 @@
+"""Average module."""
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import xarray
+from roocs_utils.xarray_utils import xarray_utils as xu
+
+from clisops.utils.cache_utils import LRUCache, hash_arrays
+
+__all__ = [
+    "average_over_dims",
+]
+
+# Types of coordinates that can be averaged over, as identified by roocs_utils
+_AVERAGE_DIMS = ["time", "level", "latitude", "longitude"]
+
+_area_weights_cache = LRUCache(maxsize=8)
+
+
+def average_over_dims(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    dims: Sequence[str] = None,
+    ignore_undetected_dims: bool = False,
+    area_weighted: bool = True,
+    areacella: Optional[xarray.DataArray] = None,
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Average a DataArray or Dataset over the dimensions of the given coordinate types.
+
+    NaN values are skipped. Dask-backed data stays lazy: the mean is computed chunk by chunk and the partial sums are
+    combined as a tree, so the memory needed is bounded by the chunk size rather than by the size of the data.
+    Bounds of the averaged coordinates are dropped, other variables not having the averaged dimensions are kept.
+
+    Averages over latitude and/or longitude are weighted by the cell areas, taken from `areacella` (or an
+    "areacella" variable of `ds`), computed from the coordinate bounds or, without bounds, proportional to the
+    cosine of the latitude. The weighted sum and the sum of the weights of the valid values are both built on the
+    same chunks, so the data is read once.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Input values.
+    dims : Sequence[str]
+      Types of the coordinates to average over, among "time", "level", "latitude" and "longitude".
+    ignore_undetected_dims : bool
+      If False, raise an error when a requested dimension is not found in `ds`, otherwise ignore it.
+    area_weighted : bool
+      Whether to weight the averages over latitude and longitude by the cell areas.
+    areacella : Optional[xarray.DataArray]
+      Cell areas, on the latitude and/or longitude dimensions of `ds`.
+
+    Returns
+    -------
+    Union[xarray.DataArray, xarray.Dataset]
+      The average of `ds` over the requested dimensions.
+
+    Examples
+    --------
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.average import average_over_dims  # doctest: +SKIP
+    >>> ds = xr.open_mfdataset(path_to_tas_files, chunks={"time": 365})  # doctest: +SKIP
+    >>> spatial_mean = average_over_dims(ds, dims=["latitude", "longitude"])  # doctest: +SKIP
+    """
+    if not dims:
+        raise ValueError("At least one dimension for averaging must be provided.")
+
+    unknown = [d for d in dims if d not in _AVERAGE_DIMS]
+    if unknown:
+        raise ValueError(
+            f"Unknown dimensions requested for averaging: {unknown}. Must be within: {_AVERAGE_DIMS}."
+        )
+
+    found_dims = {}
+    for dim_type in dims:
+        coord = xu.get_coord_by_type(ds, dim_type, ignore_aux_coords=True)
+        if coord is not None:
+            found_dims[dim_type] = coord.name
+
+    missing = [d for d in dims if d not in found_dims]
+    if missing and not ignore_undetected_dims:
+        raise ValueError(
+            f"Requested dimensions were not found in input dataset: {missing}."
+        )
+    if not found_dims:
+        return ds
+
+    avg_dims = list(found_dims.values())
+    lat, lon = found_dims.get("latitude"), found_dims.get("longitude")
+
+    weights = None
+    if area_weighted and (lat or lon):
+        if areacella is None and isinstance(ds, xarray.Dataset):
+            areacella = ds.data_vars.get("areacella")
+        weights = _get_area_weights(ds, lat=lat, lon=lon, areacella=areacella)
+
+    if isinstance(ds, xarray.Dataset):
+        # The average of the bounds of an averaged coordinate is meaningless
+        drop = [ds[d].attrs.get("bounds") for d in avg_dims] + ["areacella"]
+        ds = ds.drop_vars([v for v in drop if v in ds.variables])
+
+    if weights is None:
+        return ds.mean(dim=avg_dims, skipna=True, keep_attrs=True)
+
+    if isinstance(ds, xarray.DataArray):
+        return _weighted_mean(ds, weights, avg_dims)
+
+    # Same variables as kept by `Dataset.mean`
+    out = {}
+    for name, da in ds.data_vars.items():
+        if not set(avg_dims).intersection(da.dims):
+            out[name] = da
+        elif np.issubdtype(da.dtype, np.number):
+            out[name] = _weighted_mean(da, weights, avg_dims)
+    return xarray.Dataset(out, attrs=ds.attrs)
+
+
+def _weighted_mean(
+    da: xarray.DataArray, weights: xarray.DataArray, dims: Sequence[str]
+) -> xarray.DataArray:
+    """Weighted mean of `da` over `dims`, skipping NaNs, with the weights of the valid values only."""
+    dims = [d for d in dims if d in da.dims]
+    total = (da * weights).sum(dim=dims, skipna=True)
+    norm = (weights * da.notnull()).sum(dim=dims)
+    out = total / norm
+    if np.issubdtype(da.dtype, np.floating):
+        out = out.astype(da.dtype)
+    out.attrs = da.attrs
+    out.name = da.name
+    return out
+
+
+def _get_area_weights(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    lat: Optional[str],
+    lon: Optional[str],
+    areacella: Optional[xarray.DataArray] = None,
+) -> xarray.DataArray:
+    """Return cell area weights along the averaged latitude and longitude dimensions, cached by grid."""
+    if areacella is not None:
+        # Aligned on the data by dimension names only, so that small differences of coordinates between the files of
+        # the data and of the areas don't drop any cell. Averaging over only one of its dimensions is still weighted
+        # by the full cell areas.
+        return xarray.DataArray(
+            np.nan_to_num(np.asarray(areacella.values, dtype=float)),
+            dims=areacella.dims,
+        )
+
+    bnds = {}
+    for name in [lat, lon]:
+        bnds_name = ds[name].attrs.get("bounds") if name is not None else None
+        if isinstance(ds, xarray.Dataset) and bnds_name in ds.variables:
+            bnds[name] = ds.variables[bnds_name]
+
+    arrays = [np.asarray(ds[name].values) for name in [lat, lon] if name is not None]
+    arrays += [np.asarray(b.values) for b in bnds.values()]
+    key = (lat, lon, tuple(bnds)) + (hash_arrays(*arrays),)
+    weights = _area_weights_cache.get(key)
+    if weights is not None:
+        return weights
+
+    weights = xarray.DataArray(1.0)
+    if lat is not None:
+        if lat in bnds:
+            b = np.deg2rad(np.asarray(bnds[lat].values, dtype=float))
+            w = np.abs(np.sin(b[..., 1]) - np.sin(b[..., 0]))
+        else:
+            w = np.cos(np.deg2rad(np.asarray(ds[lat].values, dtype=float)))
+        weights = weights * xarray.DataArray(w, dims=(lat,), coords={lat: ds[lat]})
+    if lon in bnds:
+        b = np.asarray(bnds[lon].values, dtype=float)
+        d = np.abs(b[..., 1] - b[..., 0])
+        # Cells with bounds on both sides of the 0/360 or -180/180 cut
+        w = np.where((d > 180) & (d < 360), 360 - d, d)
+        weights = weights * xarray.DataArray(w, dims=(lon,), coords={lon: ds[lon]})
+
+    _area_weights_cache.put(key, weights)
+    return weights
@@ -0,0 +1,129 @@
+"""Region statistics module."""
+from functools import partial
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import xarray
+from scipy import sparse
+
+from clisops.utils.sparse_utils import STATISTICS, aggregate_cells, mask_to_sparse
+
+__all__ = [
+    "aggregate_regions",
+]
+
+
+def aggregate_regions(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    mask: xarray.DataArray,
+    how: str = "mean",
+    weights: Optional[xarray.DataArray] = None,
+    regions: Optional[Sequence] = None,
+    region_dim: str = "regions",
+    spatial_dims: Optional[Sequence[str]] = None,
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Compute a statistic over the grid cells of each region, for all regions in a single pass over the data.
+
+    The cells of every region are gathered in a sparse matrix built from the mask, so that sums and means are
+    computed as a sparse matrix product and minimums and maximums as segmented reductions. Dask-backed data stays
+    lazy and is reduced chunk by chunk along its non-spatial dimensions, spatial dimensions being merged into a
+    single chunk.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Input data. For a Dataset, only the variables having all the spatial dimensions of `mask` are aggregated.
+    mask : Union[xarray.DataArray, scipy.sparse.spmatrix]
+      Integer label mask, as returned by `create_mask(..., as_labels=True)` (-1 outside of all regions), coverage
+      fractions with a `region_dim` dimension, or a sparse (regions, cells) matrix of coverage fractions, as
+      returned by `create_coverage_mask`.
+    how : str
+      Statistic to compute, one of "mean", "sum", "min" or "max". NaN values are skipped.
+    weights : Optional[xarray.DataArray]
+      Cell weights along the spatial dimensions (e.g. cell areas), used by "mean" and "sum".
+    regions : Optional[Sequence]
+      Coordinate values of the regions (e.g. `poly.index`). Defaults to the region positions, or to the
+      coordinate of `region_dim` for coverage masks.
+    region_dim : str
+      Name of the regions dimension.
+    spatial_dims : Optional[Sequence[str]]
+      Dimensions of `ds` the cells of a sparse `mask` are flattened over, in order, e.g. ["lon", "lat"]. Required
+      for sparse masks only.
+
+    Returns
+    -------
+    Union[xarray.DataArray, xarray.Dataset]
+      The statistic with the spatial dimensions replaced by `region_dim`.
+
+    Examples
+    --------
+    >>> import geopandas as gpd  # doctest: +SKIP
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.subset import create_mask  # doctest: +SKIP
+    >>> from clisops.core.regions import aggregate_regions  # doctest: +SKIP
+    >>> ds = xr.open_dataset(path_to_tasmin_file, chunks={"time": 365})  # doctest: +SKIP
+    >>> polys = gpd.read_file(path_to_multi_shape_file)  # doctest: +SKIP
+    >>> mask = create_mask(x_dim=ds.lon, y_dim=ds.lat, poly=polys, as_labels=True)  # doctest: +SKIP
+    >>> tn = aggregate_regions(ds.tasmin, mask, how="mean", regions=polys.index)  # doctest: +SKIP
+    """
+    if how not in STATISTICS:
+        raise ValueError(
+            f'Statistic "{how}" not recognised. Must be one of: {STATISTICS}.'
+        )
+
+    if sparse.issparse(mask):
+        if spatial_dims is None:
+            raise ValueError("The spatial dimensions of sparse masks must be given.")
+        cells = sparse.csr_matrix(mask, dtype=float)
+        spatial_dims = list(spatial_dims)
+        coords = np.arange(cells.shape[0]) if regions is None else np.asarray(regions)
+    else:
+        cells, spatial_dims, coords = _region_cells(mask, region_dim, regions)
+    if weights is not None:
+        w = weights.transpose(*spatial_dims).values.ravel()
+        cells = sparse.csr_matrix(cells.multiply(np.nan_to_num(w)[np.newaxis, :]))
+
+    func = partial(aggregate_cells, spatial_dims=spatial_dims, cells=cells, how=how)
+    if isinstance(ds, xarray.Dataset):
+        out = xarray.Dataset(
+            {
+                v: func(ds[v])
+                for v in ds.data_vars
+                if set(spatial_dims).issubset(ds[v].dims)
+            },
+            attrs=ds.attrs,
+        )
+    else:
+        out = func(ds)
+
+    return out.rename({"_region": region_dim}).assign_coords({region_dim: coords})
+
+
+def _region_cells(
+    mask: xarray.DataArray, region_dim: str, regions: Optional[Sequence] = None
+):
+    """Return the sparse (regions, cells) matrix of a mask, its spatial dimensions and the regions coordinate."""
+    if region_dim in mask.dims:
+        # Coverage fractions
+        spatial_dims = [d for d in mask.dims if d != region_dim]
+        frac = mask.transpose(region_dim, *spatial_dims).values
+        cells = sparse.csr_matrix(
+            np.nan_to_num(frac.reshape(frac.shape[0], -1)).astype(float)
+        )
+        if regions is None:
+            regions = (
+                mask[region_dim].values
+                if region_dim in mask.coords
+                else np.arange(frac.shape[0])
+            )
+    else:
+        spatial_dims = list(mask.dims)
+        labels = mask.values
+        if not np.issubdtype(labels.dtype, np.integer):
+            labels = np.where(np.isnan(labels), -1, labels).astype(int)
+        cells = mask_to_sparse(
+            labels, n_regions=None if regions is None else len(regions)
+        ).astype(float)
+        if regions is None:
+            regions = np.arange(cells.shape[0])
+    return cells, spatial_dims, np.asarray(regions)
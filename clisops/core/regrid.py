@@ -0,0 +1,431 @@
+"""Regridding module."""
+import hashlib
+from functools import partial
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+import xarray
+from roocs_utils.xarray_utils import xarray_utils as xu
+from scipy import sparse
+
+from clisops.utils.cache_utils import LRUCache, hash_arrays, write_atomic
+from clisops.utils.grid_utils import cell_edges, get_spatial_index, lonlat_to_xyz
+from clisops.utils.sparse_utils import aggregate_cells
+
+__all__ = [
+    "regrid",
+    "regrid_weights",
+    "regular_grid",
+]
+
+_METHODS = ["conservative", "bilinear", "nearest"]
+
+_weights_cache = LRUCache(maxsize=8)
+
+
+class _Grid:
+    """Latitudes, longitudes and cell bounds of a rectilinear or curvilinear grid."""
+
+    def __init__(self, ds: Union[xarray.DataArray, xarray.Dataset]):
+        lat = xu.get_coord_by_type(ds, "latitude", ignore_aux_coords=False)
+        lon = xu.get_coord_by_type(ds, "longitude", ignore_aux_coords=False)
+        if lat is None or lon is None:
+            raise ValueError("Latitude and longitude coordinates must be provided.")
+
+        self.lat = ds[lat.name]
+        self.lon = ds[lon.name]
+        self.rectilinear = self.lat.ndim == 1 and self.lon.ndim == 1
+        if self.rectilinear:
+            self.dims = (self.lat.dims[0], self.lon.dims[0])
+        elif self.lat.dims == self.lon.dims and self.lat.ndim == 2:
+            self.dims = self.lat.dims
+        else:
+            raise ValueError(
+                "Latitude and longitude must be 1D coordinates or 2D coordinates on the same dimensions."
+            )
+
+        self.bounds = {}
+        if isinstance(ds, xarray.Dataset):
+            for coord in [self.lat, self.lon]:
+                name = coord.attrs.get("bounds")
+                if name in ds.variables:
+                    self.bounds[coord.name] = ds[name]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        if self.rectilinear:
+            return self.lat.size, self.lon.size
+        return self.lat.shape
+
+    def arrays(self) -> list:
+        """Coordinate arrays identifying the grid."""
+        arrays = [np.asarray(self.lat.values), np.asarray(self.lon.values)]
+        return arrays + [np.asarray(b.values) for b in self.bounds.values()]
+
+    def cell_bounds(self, coord: xarray.DataArray) -> np.ndarray:
+        """Return the (n, 2) increasing bounds of the cells of a 1D coordinate."""
+        bnds = self.bounds.get(coord.name)
+        values = np.asarray(coord.values, dtype=float)
+        edges, order = cell_edges(
+            values, None if bnds is None else np.asarray(bnds.values, dtype=float)
+        )
+        out = np.empty((values.size, 2))
+        out[order, 0] = edges[:-1]
+        out[order, 1] = edges[1:]
+        return out
+
+
+def regular_grid(resolution: float) -> xarray.Dataset:
+    """Return a global regular latitude-longitude grid, with cell bounds.
+
+    Parameters
+    ----------
+    resolution : float
+      Grid spacing in degrees, dividing 180.
+
+    Returns
+    -------
+    xarray.Dataset
+      Grid with "lat" and "lon" coordinates of the cell centers, from -90 and -180, and their "lat_bnds" and
+      "lon_bnds" bounds.
+    """
+    n_lat = int(round(180 / resolution))
+    if n_lat < 1 or not np.isclose(n_lat * resolution, 180):
+        raise ValueError(f"The resolution {resolution} must divide 180 degrees.")
+
+    lat_edges = np.linspace(-90, 90, n_lat + 1)
+    lon_edges = np.linspace(-180, 180, 2 * n_lat + 1)
+    ds = xarray.Dataset(
+        {
+            "lat_bnds": (
+                ("lat", "bnds"),
+                np.stack([lat_edges[:-1], lat_edges[1:]], axis=1),
+            ),
+            "lon_bnds": (
+                ("lon", "bnds"),
+                np.stack([lon_edges[:-1], lon_edges[1:]], axis=1),
+            ),
+        },
+        coords={
+            "lat": ("lat", (lat_edges[:-1] + lat_edges[1:]) / 2),
+            "lon": ("lon", (lon_edges[:-1] + lon_edges[1:]) / 2),
+        },
+    )
+    ds.lat.attrs.update(
+        standard_name="latitude", units="degrees_north", bounds="lat_bnds"
+    )
+    ds.lon.attrs.update(
+        standard_name="longitude", units="degrees_east", bounds="lon_bnds"
+    )
+    return ds
+
+
+def regrid_weights(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    grid: Union[xarray.DataArray, xarray.Dataset],
+    method: str = "conservative",
+    weights_dir: Optional[Union[str, Path]] = None,
+) -> sparse.csr_matrix:
+    """Return the regridding weights from the grid of `ds` to `grid`, computing them only once per pair of grids.
+
+    Weights are kept in memory, and in `weights_dir` if given, keyed on the coordinates and bounds of both grids
+    and on the method.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Data on the source grid.
+    grid : Union[xarray.DataArray, xarray.Dataset]
+      Target grid.
+    method : str
+      Regridding method, one of "conservative", "bilinear" or "nearest". "conservative" and "bilinear" require
+      rectilinear grids.
+    weights_dir : Optional[Union[str, Path]]
+      Directory where weights are stored as .npz files, to be reused by other processes.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+      Matrix of shape (target cells, source cells), cells being flattened in (latitude, longitude) order on
+      rectilinear grids and in the order of the coordinates dimensions on curvilinear grids.
+    """
+    _check_method(method)
+    return _get_weights(_Grid(ds), _Grid(grid), method, weights_dir)
+
+
+def regrid(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    grid: Union[xarray.DataArray, xarray.Dataset],
+    method: str = "conservative",
+    weights_dir: Optional[Union[str, Path]] = None,
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Regrid a DataArray or Dataset to another latitude-longitude grid.
+
+    The weights are computed once per pair of grids and method (see :py:func:`regrid_weights`) as a sparse matrix,
+    applied chunk by chunk as a sparse matrix product over the flattened spatial dimensions. Conservative and
+    bilinear weights are the Kronecker product of the weights along latitude and along longitude. Target cells
+    are averages of the valid source values only, so that missing values don't spread.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Input values.
+    grid : Union[xarray.DataArray, xarray.Dataset]
+      Target grid, with latitude and longitude coordinates, and optionally their bounds.
+    method : str
+      Regridding method, one of "conservative", "bilinear" or "nearest":
+        - "conservative": average of the source cells weighted by their overlap with the target cell, on the sphere.
+        - "bilinear": linear interpolation along latitude and along longitude.
+        - "nearest": value of the closest source grid point, on any grid. The source grid point of every target
+          cell is found once with the KD-tree used by `subset_gridpoint`, and picked with a single take per chunk.
+    weights_dir : Optional[Union[str, Path]]
+      Directory where weights are stored as .npz files, to be reused by other processes.
+
+    Returns
+    -------
+    Union[xarray.DataArray, xarray.Dataset]
+      Values on the target grid. For a Dataset, variables depending on only some of the spatial dimensions, such as
+      the coordinates bounds, are replaced by those of `grid`, if any.
+
+    Examples
+    --------
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.regrid import regrid, regular_grid  # doctest: +SKIP
+    >>> ds = xr.open_dataset(path_to_tas_file, chunks={"time": 12})  # doctest: +SKIP
+    >>> out = regrid(ds, regular_grid(1.0), method="conservative")  # doctest: +SKIP
+    """
+    _check_method(method)
+    src, tgt = _Grid(ds), _Grid(grid)
+    weights = _get_weights(src, tgt, method, weights_dir)
+    if method == "nearest":
+        # Each target cell has a single source cell: apply the flat index map rather than the matrix product
+        weights = weights.indices
+
+    if isinstance(ds, xarray.DataArray):
+        return _regrid_dataarray(ds, src, tgt, weights)
+
+    out = {}
+    for name, da in ds.data_vars.items():
+        if set(src.dims).issubset(da.dims):
+            if np.issubdtype(da.dtype, np.number):
+                out[name] = _regrid_dataarray(da, src, tgt, weights)
+        elif not set(src.dims).intersection(da.dims):
+            out[name] = da
+    out.update({b.name: b.variable for b in tgt.bounds.values()})
+    return xarray.Dataset(out, attrs=ds.attrs)
+
+
+def _check_method(method: str):
+    if method not in _METHODS:
+        raise ValueError(
+            f'Regridding method "{method}" not recognised. Must be one of: {_METHODS}.'
+        )
+
+
+def _regrid_dataarray(
+    da: xarray.DataArray,
+    src: _Grid,
+    tgt: _Grid,
+    weights: Union[sparse.csr_matrix, np.ndarray],
+) -> xarray.DataArray:
+    """Apply the (target cells, source cells) weights, or the flat source index of each target cell, to the
+    spatial dimensions of `da`."""
+    if isinstance(weights, np.ndarray):
+        out = _take_cells(da, spatial_dims=src.dims, index=weights)
+    else:
+        out = aggregate_cells(da, spatial_dims=src.dims, cells=weights, how="mean")
+    other_dims = list(out.dims[:-1])
+    data = out.data.reshape(out.shape[:-1] + tgt.shape)
+    if np.issubdtype(da.dtype, np.floating):
+        data = data.astype(da.dtype)
+
+    out = xarray.DataArray(
+        data,
+        dims=other_dims + list(tgt.dims),
+        coords=out.coords,
+        name=da.name,
+        attrs=da.attrs,
+    )
+    return out.assign_coords({tgt.lat.name: tgt.lat, tgt.lon.name: tgt.lon})
+
+
+def _take_cells(
+    da: xarray.DataArray, spatial_dims: Sequence[str], index: np.ndarray
+) -> xarray.DataArray:
+    """Pick the flattened cells `index` of the spatial dimensions of a DataArray, with a single take per chunk."""
+    other_dims = [d for d in da.dims if d not in spatial_dims]
+    da = da.transpose(*other_dims, *spatial_dims)
+    data = da.data
+    n_cells = int(np.prod(data.shape[len(other_dims) :]))
+    shape = data.shape[: len(other_dims)] + (n_cells,)
+    take = partial(np.take, indices=index, axis=-1)
+
+    if da.chunks is not None:
+        data = data.rechunk({i: -1 for i in range(len(other_dims), data.ndim)})
+        data = data.reshape(shape)
+        out = data.map_blocks(
+            take, chunks=data.chunks[:-1] + ((index.size,),), dtype=data.dtype
+        )
+    else:
+        out = take(np.reshape(data, shape))
+
+    return xarray.DataArray(
+        out,
+        dims=other_dims + ["_region"],
+        coords={
+            k: v for k, v in da.coords.items() if set(v.dims).issubset(other_dims)
+        },
+        name=da.name,
+        attrs=da.attrs,
+    )
+
+
+def _get_weights(
+    src: _Grid,
+    tgt: _Grid,
+    method: str,
+    weights_dir: Optional[Union[str, Path]] = None,
+) -> sparse.csr_matrix:
+    """Return the weights from the cache, or compute and cache them."""
+    h = hashlib.sha1()
+    h.update(hash_arrays(*src.arrays()).encode())
+    h.update(hash_arrays(*tgt.arrays()).encode())
+    h.update(method.encode())
+    key = h.hexdigest()
+
+    weights = _weights_cache.get(key)
+    if weights is None and weights_dir is not None:
+        path = Path(weights_dir) / f"{key}.npz"
+        if path.exists():
+            weights = sparse.load_npz(path).tocsr()
+    if weights is not None:
+        _weights_cache.put(key, weights)
+        return weights
+
+    if method == "nearest":
+        weights = _nearest_weights(src, tgt)
+    elif not (src.rectilinear and tgt.rectilinear):
+        raise ValueError(
+            f'The "{method}" method requires rectilinear grids, use the "nearest" method on curvilinear grids.'
+        )
+    elif method == "bilinear":
+        weights = sparse.kron(
+            _linear_weights(src.lat.values, tgt.lat.values),
+            _linear_weights(
+                src.lon.values, tgt.lon.values, wrap=True, periodic=_is_global(src)
+            ),
+        )
+    else:
+        # Cell areas on the sphere are proportional to the differences of sin(lat)
+        src_lat, tgt_lat = (
+            np.sin(np.deg2rad(np.clip(g.cell_bounds(g.lat), -90, 90)))
+            for g in [src, tgt]
+        )
+        weights = sparse.kron(
+            _overlap_weights(src_lat, tgt_lat),
+            _overlap_weights(
+                src.cell_bounds(src.lon), tgt.cell_bounds(tgt.lon), period=360
+            ),
+        )
+
+    weights = sparse.csr_matrix(weights)
+    weights.eliminate_zeros()
+
+    _weights_cache.put(key, weights)
+    if weights_dir is not None:
+        write_atomic(
+            Path(weights_dir) / f"{key}.npz", lambda f: sparse.save_npz(f, weights)
+        )
+
+    return weights
+
+
+def _is_global(grid: _Grid) -> bool:
+    """Whether the longitudes of a rectilinear grid wrap around the globe."""
+    bnds = grid.cell_bounds(grid.lon)
+    return bool(np.isclose(bnds[:, 1].max() - bnds[:, 0].min(), 360, atol=1e-6))
+
+
+def _nearest_weights(src: _Grid, tgt: _Grid) -> sparse.csr_matrix:
+    """Weights picking the closest source grid point of each target grid point.
+
+    Each row has a single value, so that the column indices of the matrix are the flat source index of each target
+    grid point.
+    """
+    src_lon, src_lat = _grid_points(src)
+    tgt_lon, tgt_lat = _grid_points(tgt)
+
+    tree, valid = get_spatial_index(src_lon, src_lat)
+    _, nearest = tree.query(lonlat_to_xyz(tgt_lon, tgt_lat))
+    return sparse.csr_matrix(
+        (np.ones(tgt_lon.size), (np.arange(tgt_lon.size), valid[nearest])),
+        shape=(tgt_lon.size, src_lon.size),
+    )
+
+
+def _grid_points(grid: _Grid) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the flattened longitudes and latitudes of all the grid points."""
+    lon = np.asarray(grid.lon.values, dtype=float)
+    lat = np.asarray(grid.lat.values, dtype=float)
+    if grid.rectilinear:
+        lat, lon = np.meshgrid(lat, lon, indexing="ij")
+    return np.ravel(lon), np.ravel(lat)
+
+
+def _linear_weights(
+    src: np.ndarray, tgt: np.ndarray, wrap: bool = False, periodic: bool = False
+) -> sparse.csr_matrix:
+    """Linear interpolation weights from 1D coordinates `src` to `tgt`.
+
+    Longitudes (`wrap`) are compared modulo 360 and get no weights beyond the end points, unless `periodic`. Other
+    coordinates are held constant beyond the end points.
+    """
+    src = np.asarray(src, dtype=float)
+    tgt = np.asarray(tgt, dtype=float)
+    order = np.argsort(src, kind="stable")
+    s = src[order]
+    n = tgt.size
+    rows = np.arange(n)
+
+    if wrap:
+        tgt = (tgt - s[0]) % 360 + s[0]
+    if periodic:
+        s = np.append(s, s[0] + 360)
+        order = np.append(order, order[0])
+    elif wrap:
+        inside = tgt <= s[-1]
+        rows, tgt = rows[inside], tgt[inside]
+    else:
+        tgt = np.clip(tgt, s[0], s[-1])
+
+    if s.size == 1:
+        i, frac = np.zeros(tgt.size, dtype=int), np.zeros(tgt.size)
+        s, order = np.append(s, s), np.append(order, order)
+    else:
+        i = np.clip(np.searchsorted(s, tgt, side="right") - 1, 0, s.size - 2)
+        frac = (tgt - s[i]) / (s[i + 1] - s[i])
+
+    return sparse.csr_matrix(
+        (
+            np.concatenate([1 - frac, frac]),
+            (np.concatenate([rows, rows]), np.concatenate([order[i], order[i + 1]])),
+        ),
+        shape=(n, src.size),
+    )
+
+
+def _overlap_weights(
+    src: np.ndarray, tgt: np.ndarray, period: Optional[float] = None
+) -> sparse.csr_matrix:
+    """Overlap lengths of the (n, 2) increasing cell bounds `tgt` with the cell bounds `src`.
+
+    With a `period`, source cells are also shifted by one period on each side.
+    """
+    shifts = [0] if period is None else [-period, 0, period]
+    overlap = 0
+    for shift in shifts:
+        lo = np.maximum(tgt[:, np.newaxis, 0], src[np.newaxis, :, 0] + shift)
+        hi = np.minimum(tgt[:, np.newaxis, 1], src[np.newaxis, :, 1] + shift)
+        overlap = overlap + np.clip(hi - lo, 0, None)
+    return sparse.csr_matrix(overlap)
@@ -0,0 +1,243 @@
+"""Temporal resampling module."""
+import warnings
+from functools import partial
+from typing import Union
+
+import numpy as np
+import xarray
+from roocs_utils.xarray_utils import xarray_utils as xu
+
+from clisops.utils.sparse_utils import STATISTICS, mask_to_sparse, reduce_cells
+
+__all__ = [
+    "climatology",
+    "resample",
+]
+
+_RESAMPLE_FREQS = ["year", "season", "month"]
+_CLIMATOLOGY_FREQS = ["season", "month", "dayofyear"]
+_SEASONS = np.array(["DJF", "MAM", "JJA", "SON"])
+
+
+def resample(
+    ds: Union[xarray.DataArray, xarray.Dataset], freq: str, how: str = "mean"
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Compute a statistic over the time steps of each year, season or month.
+
+    Groups are found once from the calendar fields of the time coordinate, so any calendar handled by xarray works,
+    including cftime calendars opened with `use_cftime=True`, without grouping on the timestamps themselves. The time
+    steps are reduced with a sparse matrix product (segmented reductions for "min" and "max"). Dask-backed data is
+    rechunked on group boundaries, each time chunk being reduced to its own groups, so that the output is chunked
+    along time like the input.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Input values.
+    freq : str
+      Resampling frequency, one of "year", "season" or "month". Seasons are DJF, MAM, JJA and SON, December being
+      part of the season of the following year.
+    how : str
+      Statistic to compute, one of "mean", "sum", "min" or "max". NaN values are skipped.
+
+    Returns
+    -------
+    Union[xarray.DataArray, xarray.Dataset]
+      The statistic of each period, labelled by the first time step of the period. Time bounds are dropped.
+
+    Examples
+    --------
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.resample import resample  # doctest: +SKIP
+    >>> ds = xr.open_mfdataset(path_to_tas_files, use_cftime=True, chunks={"time": 365})  # doctest: +SKIP
+    >>> annual_mean = resample(ds, freq="year")  # doctest: +SKIP
+    """
+    if freq not in _RESAMPLE_FREQS:
+        raise ValueError(
+            f'Resampling frequency "{freq}" not recognised. Must be one of: {_RESAMPLE_FREQS}.'
+        )
+
+    time = _get_time(ds)
+    year = time.dt.year.values.astype(np.int64)
+    month = time.dt.month.values.astype(np.int64)
+    if freq == "year":
+        codes = year
+    elif freq == "month":
+        codes = year * 12 + month - 1
+    else:
+        codes = (year + (month == 12)) * 4 + (month % 12) // 3
+
+    groups, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    coord = time[first]
+    return _group_reduce(ds, time.name, inverse, len(groups), time.name, coord, how)
+
+
+def climatology(
+    ds: Union[xarray.DataArray, xarray.Dataset], freq: str, how: str = "mean"
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Compute a statistic over the time steps of each season, month or day of the year, over all years.
+
+    Groups are found and reduced as in :py:func:`resample`.
+
+    Parameters
+    ----------
+    ds : Union[xarray.DataArray, xarray.Dataset]
+      Input values.
+    freq : str
+      Climatology frequency, one of "season", "month" or "dayofyear".
+    how : str
+      Statistic to compute, one of "mean", "sum", "min" or "max". NaN values are skipped.
+
+    Returns
+    -------
+    Union[xarray.DataArray, xarray.Dataset]
+      The statistic with the time dimension replaced by a `freq` dimension, holding only the groups found in `ds`.
+      Time bounds are dropped.
+
+    Examples
+    --------
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.resample import climatology  # doctest: +SKIP
+    >>> ds = xr.open_mfdataset(path_to_tas_files, use_cftime=True, chunks={"time": 365})  # doctest: +SKIP
+    >>> doy_clim = climatology(ds, freq="dayofyear")  # doctest: +SKIP
+    """
+    if freq not in _CLIMATOLOGY_FREQS:
+        raise ValueError(
+            f'Climatology frequency "{freq}" not recognised. Must be one of: {_CLIMATOLOGY_FREQS}.'
+        )
+
+    time = _get_time(ds)
+    if freq == "dayofyear":
+        codes = time.dt.dayofyear.values.astype(np.int64)
+    else:
+        month = time.dt.month.values.astype(np.int64)
+        codes = month if freq == "month" else (month % 12) // 3
+
+    groups, inverse = np.unique(codes, return_inverse=True)
+    if freq == "season":
+        groups = _SEASONS[groups]
+    coord = xarray.DataArray(groups, dims=(freq,), name=freq)
+    return _group_reduce(ds, time.name, inverse, len(groups), freq, coord, how)
+
+
+def _get_time(ds: Union[xarray.DataArray, xarray.Dataset]) -> xarray.DataArray:
+    time = xu.get_coord_by_type(ds, "time", ignore_aux_coords=True)
+    if time is None or time.ndim != 1:
+        raise ValueError("No time dimension found in input dataset.")
+    return ds[time.name]
+
+
+def _group_reduce(
+    ds: Union[xarray.DataArray, xarray.Dataset],
+    time_dim: str,
+    codes: np.ndarray,
+    n_groups: int,
+    group_dim: str,
+    coord: xarray.DataArray,
+    how: str,
+) -> Union[xarray.DataArray, xarray.Dataset]:
+    """Reduce the time steps of `ds` to the groups given by their integer `codes`."""
+    if how not in STATISTICS:
+        raise ValueError(
+            f'Statistic "{how}" not recognised. Must be one of: {STATISTICS}.'
+        )
+
+    # (groups, time steps) matrix, as the regions of a one dimensional label mask
+    steps = mask_to_sparse(codes, n_regions=n_groups).astype(float)
+    func = partial(_reduce_time, time_dim=time_dim, codes=codes, steps=steps, how=how)
+
+    if isinstance(ds, xarray.Dataset):
+        # The statistic of the time bounds is meaningless
+        bnds = ds[time_dim].attrs.get("bounds")
+        out = {}
+        for name, da in ds.data_vars.items():
+            if time_dim not in da.dims:
+                out[name] = da
+            elif name != bnds and np.issubdtype(da.dtype, np.number):
+                out[name] = func(da)
+        out = xarray.Dataset(out, attrs=ds.attrs)
+    else:
+        out = func(ds)
+
+    out = out.rename({"_group": group_dim})
+    return out.assign_coords({group_dim: coord.variable})
+
+
+def _reduce_time(
+    da: xarray.DataArray, time_dim: str, codes: np.ndarray, steps, how: str
+) -> xarray.DataArray:
+    """Reduce the time dimension of a DataArray to the groups given by `codes`, the rows of `steps`."""
+    dims = [d if d != time_dim else "_group" for d in da.dims]
+    other_dims = [d for d in da.dims if d != time_dim]
+    da = da.transpose(*other_dims, time_dim)
+    data = da.data
+
+    if da.chunks is not None:
+        out = _reduce_time_chunks(data, codes, how)
+    else:
+        out = reduce_cells(np.asarray(data), steps, how)
+
+    if np.issubdtype(da.dtype, np.floating):
+        out = out.astype(da.dtype)
+
+    return xarray.DataArray(
+        out,
+        dims=other_dims + ["_group"],
+        coords={k: v for k, v in da.coords.items() if time_dim not in v.dims},
+        name=da.name,
+        attrs=da.attrs,
+    ).transpose(*dims)
+
+
+def _reduce_time_chunks(data, codes: np.ndarray, how: str):
+    """Reduce the last axis of a dask array to the groups given by `codes`, chunk by chunk.
+
+    Time steps are first sorted by group if needed (e.g. for climatologies), and the time axis is rechunked on group
+    boundaries, each chunk holding whole groups and about as many time steps as the input chunks. Each chunk is then
+    reduced to its own groups only, giving an output chunked along the group axis, without combining partial
+    results.
+    """
+    from dask.array import PerformanceWarning
+
+    input_chunks = data.chunks[-1]
+    if np.any(np.diff(codes) < 0):
+        order = np.argsort(codes, kind="stable")
+        with warnings.catch_warnings():
+            # The many chunks of the sorted array are merged by the rechunk below
+            warnings.simplefilter("ignore", PerformanceWarning)
+            data = data[..., order]
+        codes = codes[order]
+
+    chunks = _group_chunks(codes, input_chunks)
+    data = data.rechunk({data.ndim - 1: chunks})
+    bounds = np.cumsum((0,) + chunks)
+    n_groups = tuple(
+        int(codes[b - 1] - codes[a] + 1) for a, b in zip(bounds, bounds[1:])
+    )
+
+    return data.map_blocks(
+        _reduce_block,
+        codes=codes,
+        how=how,
+        chunks=data.chunks[:-1] + (n_groups,),
+        dtype=float,
+    )
+
+
+def _group_chunks(codes: np.ndarray, chunks: tuple) -> tuple:
+    """Return chunks of the sorted `codes` holding whole groups, close to `chunks`.
+
+    Each chunk boundary is moved back to the start of its group, groups longer than a chunk being kept whole.
+    """
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.cumsum(chunks)[:-1]
+    bounds = starts[np.searchsorted(starts, ends, side="right") - 1]
+    bounds = np.unique(np.r_[0, bounds, codes.size])
+    return tuple(int(size) for size in np.diff(bounds))
+
+
+def _reduce_block(block: np.ndarray, codes: np.ndarray, how: str, block_info=None):
+    start, stop = block_info[0]["array-location"][-1]
+    local = codes[start:stop] - codes[start]
+    steps = mask_to_sparse(local, n_regions=int(local[-1]) + 1).astype(float)
+    return reduce_cells(block, steps, how)
@@ -1,27 +1,35 @@
 """Subset module."""
+import hashlib
 import logging
 import numbers
+import os
 import warnings
 from functools import wraps
 from pathlib import Path
-from typing import Optional, Sequence, Tuple, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
 
-import geopandas as gpd
 import numpy as np
-import pandas as pd
 import xarray
-from pyproj import Geod
-from pyproj.crs import CRS
+from roocs_utils.utils.common import parse_size
 from roocs_utils.utils.time_utils import to_isoformat
 from roocs_utils.xarray_utils import xarray_utils as xu
-from shapely import vectorized
-from shapely.geometry import LineString, MultiPolygon, Point, Polygon
-from shapely.ops import cascaded_union, split
+from scipy import sparse
+
+from clisops.utils.cache_utils import LRUCache, hash_arrays, write_atomic
+from clisops.utils.grid_utils import cell_edges, get_spatial_index, lonlat_to_xyz
+from clisops.utils.sparse_utils import mask_to_sparse
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from pyproj.crs import CRS
 
 __all__ = [
+    "create_coverage_mask",
     "create_mask",
+    "create_mask_rasterize",
     "create_mask_vectorize",
     "distance",
+    "mask_to_sparse",
     "subset_bbox",
     "subset_gridpoint",
     "subset_shape",
@@ -320,15 +328,19 @@ def convert_lat_lon_to_da(func):
     return func_checker
 
 
+# Overlap, in degrees, of the two halves of a polygon split at the Greenwich meridian.
+_MERIDIAN_EPS = 1e-9
+
+
 def wrap_lons_and_split_at_greenwich(func):
     @wraps(func)
     def func_checker(*args, **kwargs):
         """
         Split and reproject polygon vectors in a GeoDataFrame whose values cross the Greenwich Meridian.
 
-        Begins by examining whether the geometry bounds the supplied cross longitude = 0 and if so, proceeds to split
-        the polygons at the meridian into new polygons and erase a small buffer to prevent invalid geometries when
-        transforming the lons from WGS84 to WGS84 +lon_wrap=180 (longitudes from 0 to 360).
+        Begins by examining whether the geometry bounds cross longitude = 0 and if so, clips the crossing features
+        into an eastern and a western part, each overlapping the meridian by a tiny margin to ensure edge inclusion
+        in selection, and shifts the western part by 360 degrees. All operations are vectorised over the features.
 
         Returns a GeoDataFrame with the new features in a wrap_lon WGS84 projection if needed.
         """
@@ -339,10 +351,12 @@ def wrap_lons_and_split_at_greenwich(func):
         except KeyError:
             return func(*args, **kwargs)
 
+        from pyproj.crs import CRS
+        from shapely.geometry import box
+
         if wrap_lons:
-            if (np.min(x_dim) < 0 and np.max(x_dim) >= 360) or (
-                np.min(x_dim) < -180 and np.max >= 180
-            ):
+            x_min, x_max = np.min(x_dim), np.max(x_dim)
+            if (x_min < 0 and x_max >= 360) or (x_min < -180 and x_max >= 180):
                 # TODO: This should raise an exception, right?
                 warnings.warn(
                     "DataArray doesn't seem to be using lons between 0 and 360 degrees or between -180 and 180 degrees."
@@ -350,53 +364,42 @@ def wrap_lons_and_split_at_greenwich(func):
                     UserWarning,
                     stacklevel=4,
                 )
-            split_flag = False
-            for index, feature in poly.iterrows():
-                if (feature.geometry.bounds[0] < 0) and (
-                    feature.geometry.bounds[2] > 0
-                ):
-                    split_flag = True
-                    warnings.warn(
-                        "Geometry crosses the Greenwich Meridian. Proceeding to split polygon at Greenwich."
-                        " This feature is experimental. Output might not be accurate.",
-                        UserWarning,
-                        stacklevel=4,
-                    )
 
-                    # Create a meridian line at Greenwich, split polygons at this line and erase a buffer line
-                    if isinstance(feature.geometry, MultiPolygon):
-                        union = MultiPolygon(cascaded_union(feature.geometry))
-                    else:
-                        union = Polygon(cascaded_union(feature.geometry))
-                    meridian = LineString([Point(0, 90), Point(0, -90)])
-                    buffered = meridian.buffer(0.000000001)
-                    split_polygons = split(union, meridian)
-                    buffered_split_polygons = [
-                        feat.difference(buffered) for feat in split_polygons
-                    ]
-
-                    # Cannot assign iterable with `at` (pydata/pandas#26333) so a small hack:
-                    # Load split features into a new GeoDataFrame with WGS84 CRS
-                    split_gdf = gpd.GeoDataFrame(
-                        geometry=[cascaded_union(buffered_split_polygons)],
-                        crs=CRS(4326),
-                    )
-                    poly.at[[index], "geometry"] = split_gdf.geometry.values
+            # Longitudes from -180 to 180, as the meridian test below expects
+            wgs84 = CRS(4326)
+            if poly.crs is None or CRS(poly.crs) != wgs84:
+                poly = poly.to_crs(crs=wgs84)
 
-            # Reproject features in WGS84 CSR to use 0 to 360 as longitudinal values
-            wrapped_lons = CRS.from_string(
-                "+proj=longlat +ellps=WGS84 +lon_wrap=180 +datum=WGS84 +no_defs"
-            )
+            bounds = poly.geometry.bounds
+            crossing = ((bounds.minx < 0) & (bounds.maxx > 0)).values
+            western = (bounds.maxx <= 0).values
 
-            poly = poly.to_crs(crs=wrapped_lons)
-            if split_flag:
+            if crossing.any():
                 warnings.warn(
-                    "Rebuffering split polygons to ensure edge inclusion in selection.",
+                    "Geometry crosses the Greenwich Meridian. Proceeding to split polygon at Greenwich."
+                    " This feature is experimental. Output might not be accurate.",
                     UserWarning,
                     stacklevel=4,
                 )
-                poly = gpd.GeoDataFrame(poly.buffer(0.000000001), columns=["geometry"])
-                poly.crs = wrapped_lons
+
+            geometry = poly.geometry.copy()
+            if crossing.any():
+                split_geoms = geometry[crossing]
+                east = split_geoms.intersection(box(-_MERIDIAN_EPS, -90, 180, 90))
+                west = split_geoms.intersection(
+                    box(-180, -90, _MERIDIAN_EPS, 90)
+                ).translate(xoff=360)
+                geometry[crossing] = east.union(west)
+            if western.any():
+                geometry[western] = geometry[western].translate(xoff=360)
+
+            # Features in WGS84 CRS using 0 to 360 as longitudinal values
+            wrapped_lons = CRS.from_string(
+                "+proj=longlat +ellps=WGS84 +lon_wrap=180 +datum=WGS84 +no_defs"
+            )
+            poly = poly.copy()
+            poly.geometry = geometry
+            poly = poly.set_crs(wrapped_lons, allow_override=True)
 
             kwargs["poly"] = poly
 
@@ -410,13 +413,14 @@ def create_mask_vectorize(
     *,
     x_dim: xarray.DataArray = None,
     y_dim: xarray.DataArray = None,
-    poly: gpd.GeoDataFrame = None,
+    poly: "gpd.GeoDataFrame" = None,
     wrap_lons: bool = False,
     check_overlap: bool = False,
+    as_labels: bool = False,
 ):
     """Create a mask with values corresponding to the features in a GeoDataFrame using vectorize methods.
 
-    The returned mask's points have the value of the first geometry of `poly` they fall in.
+    The returned mask's points have the value of the last geometry of `poly` they fall in.
 
     Parameters
     ----------
@@ -424,16 +428,21 @@ def create_mask_vectorize(
       X or longitudinal dimension of xarray object.
     y_dim : xarray.DataArray
       Y or latitudinal dimension of xarray object.
-    poly : gpd.GeoDataFrame
+    poly : "gpd.GeoDataFrame"
       GeoDataFrame used to create the xarray.DataArray mask.
     wrap_lons : bool
       Shift vector longitudes by -180,180 degrees to 0,360 degrees; Default = False
     check_overlap: bool
       Perform a check to verify if shapes contain overlapping geometries.
+    as_labels: bool
+      Return an integer label mask instead of a float mask, see Returns.
 
     Returns
     -------
     xarray.DataArray
+      The index value of the geometry of `poly` each point falls in, NaN outside of all geometries. If `as_labels`
+      is True, the position of the geometry in `poly` instead, -1 outside of all geometries, stored in the smallest
+      integer dtype able to hold all positions.
 
     Examples
     --------
@@ -474,15 +483,33 @@ def create_mask_vectorize(
         dims_out = x_dim.dims
         coords_out = x_dim.coords
 
-    # try vectorize
-    mask = np.zeros(lat1.shape) + np.nan
-    for pp in poly.index:
-        for vv in poly[poly.index == pp].geometry.values:
-            b1 = vectorized.contains(vv, lon1.flatten(), lat1.flatten()).reshape(
-                lat1.shape
-            )
-            mask[b1] = pp
-
+    lon_flat = lon1.flatten()
+    from shapely import vectorized
+    from shapely.prepared import prep
+
+    lat_flat = lat1.flatten()
+    # Sort the grid points by longitude once to quickly find the points within each geometry's bounding box
+    order = np.argsort(lon_flat, kind="stable")
+    lon_sorted = lon_flat[order]
+
+    labels = np.full(lon_flat.shape, -1, dtype=_label_dtype(len(poly)))
+    for pp, geom in enumerate(poly.geometry):
+        if geom is None or geom.is_empty:
+            continue
+        minx, miny, maxx, maxy = geom.bounds
+        i0 = np.searchsorted(lon_sorted, minx, side="left")
+        i1 = np.searchsorted(lon_sorted, maxx, side="right")
+        cand = order[i0:i1]
+        cand = cand[(lat_flat[cand] >= miny) & (lat_flat[cand] <= maxy)]
+        if cand.size == 0:
+            continue
+
+        b1 = vectorized.contains(prep(geom), lon_flat[cand], lat_flat[cand])
+        labels[cand[b1]] = pp
+
+    mask = labels.reshape(lat1.shape)
+    if not as_labels:
+        mask = _labels_to_index(mask, poly)
     mask = xarray.DataArray(mask, dims=dims_out, coords=coords_out)
 
     return mask
@@ -493,9 +520,10 @@ def create_mask(
     *,
     x_dim: xarray.DataArray = None,
     y_dim: xarray.DataArray = None,
-    poly: gpd.GeoDataFrame = None,
+    poly: "gpd.GeoDataFrame" = None,
     wrap_lons: bool = False,
     check_overlap: bool = False,
+    as_labels: bool = False,
 ):
     """Create a mask with values corresponding to the features in a GeoDataFrame using spatial join methods.
 
@@ -507,16 +535,21 @@ def create_mask(
       X or longitudinal dimension of xarray object.
     y_dim : xarray.DataArray
       Y or latitudinal dimension of xarray object.
-    poly : gpd.GeoDataFrame
+    poly : "gpd.GeoDataFrame"
       GeoDataFrame used to create the xarray.DataArray mask.
     wrap_lons : bool
       Shift vector longitudes by -180,180 degrees to 0,360 degrees; Default = False
     check_overlap: bool
       Perform a check to verify if shapes contain overlapping geometries.
+    as_labels: bool
+      Return an integer label mask instead of a float mask, see Returns.
 
     Returns
     -------
     xarray.DataArray
+      The index value of the geometry of `poly` each point falls in, NaN outside of all geometries. If `as_labels`
+      is True, the position of the geometry in `poly` instead, -1 outside of all geometries, stored in the smallest
+      integer dtype able to hold all positions.
 
     Examples
     --------
@@ -537,6 +570,11 @@ def create_mask(
     >>> region_names = xr.DataArray(polys.id, dims=('regions',))  # doctest: +SKIP
     >>> ds = ds.assign_coords(regions_names=region_names)  # doctest: +SKIP
     """
+    import geopandas as gpd
+    import pandas as pd
+    from pyproj.crs import CRS
+    from shapely.geometry import Point
+
     wgs84 = CRS(4326)
 
     if check_overlap:
@@ -573,22 +611,544 @@ def create_mask(
         )
     gdf_points = gpd.GeoDataFrame(df, geometry="Coordinates", crs=wgs84)
 
-    # spatial join geodata points with region polygons and remove duplicates
-    point_in_poly = gpd.tools.sjoin(gdf_points, poly, how="left", op="intersects")
+    # spatial join geodata points with region polygons (indexed by position) and remove duplicates
+    point_in_poly = gpd.tools.sjoin(
+        gdf_points, poly.reset_index(drop=True), how="left", op="intersects"
+    )
     point_in_poly = point_in_poly.loc[~point_in_poly.index.duplicated(keep="first")]
 
-    # extract polygon ids for points
-    mask = point_in_poly["index_right"]
-    mask_2d = np.array(mask).reshape(lat1.shape[0], lat1.shape[1])
+    # extract polygon positions for points
+    labels = point_in_poly["index_right"].fillna(-1).values
+    mask_2d = labels.astype(_label_dtype(len(poly))).reshape(lat1.shape)
+    if not as_labels:
+        mask_2d = _labels_to_index(mask_2d, poly)
     mask_2d = xarray.DataArray(mask_2d, dims=dims_out, coords=coords_out)
     return mask_2d
 
 
+@wrap_lons_and_split_at_greenwich
+def create_mask_rasterize(
+    *,
+    x_dim: xarray.DataArray = None,
+    y_dim: xarray.DataArray = None,
+    poly: "gpd.GeoDataFrame" = None,
+    wrap_lons: bool = False,
+    check_overlap: bool = False,
+    as_labels: bool = False,
+):
+    """Create a mask with values corresponding to the features in a GeoDataFrame by rasterizing polygons.
+
+    The polygons are burnt into the grid row by row using an even-odd scanline algorithm, which is much faster
+    than testing every grid point against every polygon. Only rectilinear grids (1D `x_dim` and `y_dim`) are
+    supported. The returned mask's points have the value of the last geometry of `poly` they fall in. Grid
+    points lying exactly on a polygon's boundary may be assigned differently than with the other methods.
+
+    Parameters
+    ----------
+    x_dim : xarray.DataArray
+      X or longitudinal dimension of xarray object.
+    y_dim : xarray.DataArray
+      Y or latitudinal dimension of xarray object.
+    poly : "gpd.GeoDataFrame"
+      GeoDataFrame used to create the xarray.DataArray mask.
+    wrap_lons : bool
+      Shift vector longitudes by -180,180 degrees to 0,360 degrees; Default = False
+    check_overlap: bool
+      Perform a check to verify if shapes contain overlapping geometries.
+    as_labels: bool
+      Return an integer label mask instead of a float mask, see Returns.
+
+    Returns
+    -------
+    xarray.DataArray
+      The index value of the geometry of `poly` each point falls in, NaN outside of all geometries. If `as_labels`
+      is True, the position of the geometry in `poly` instead, -1 outside of all geometries, stored in the smallest
+      integer dtype able to hold all positions.
+
+    Examples
+    --------
+    >>> import geopandas as gpd  # doctest: +SKIP
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.subset import create_mask_rasterize  # doctest: +SKIP
+    >>> ds = xr.open_dataset(path_to_tasmin_file)  # doctest: +SKIP
+    >>> polys = gpd.read_file(path_to_multi_shape_file)  # doctest: +SKIP
+    ...
+    # Get a mask from all polygons in the shape file
+    >>> mask = create_mask_rasterize(x_dim=ds.lon, y_dim=ds.lat, poly=polys)  # doctest: +SKIP
+    """
+    if check_overlap:
+        _check_has_overlaps(polygons=poly)
+    if wrap_lons:
+        warnings.warn("Wrapping longitudes at 180 degrees.")
+
+    if len(x_dim.shape) != 1 or len(y_dim.shape) != 1:
+        raise ValueError(
+            "Rasterizing polygons requires a rectilinear grid with 1D lon and lat coordinates."
+        )
+
+    mask = _rasterize(np.asarray(x_dim.values), np.asarray(y_dim.values), poly)
+    if not as_labels:
+        mask = _labels_to_index(mask, poly)
+
+    return _mask_dataarray(mask, x_dim, y_dim)
+
+
+def _label_dtype(n: int) -> np.dtype:
+    """Return the smallest signed integer dtype holding labels from -1 to n - 1."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n - 1 <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _labels_to_index(labels: np.ndarray, poly: "gpd.GeoDataFrame") -> np.ndarray:
+    """Convert positional labels to a float mask of the `poly` index values, NaN where labels are -1."""
+    mask = np.full(labels.shape, np.nan)
+    inside = labels >= 0
+    mask[inside] = np.asarray(poly.index)[labels[inside]]
+    return mask
+
+
+@wrap_lons_and_split_at_greenwich
+def create_coverage_mask(
+    *,
+    x_dim: xarray.DataArray = None,
+    y_dim: xarray.DataArray = None,
+    poly: "gpd.GeoDataFrame" = None,
+    x_bnds: Optional[Union[xarray.DataArray, np.ndarray]] = None,
+    y_bnds: Optional[Union[xarray.DataArray, np.ndarray]] = None,
+    wrap_lons: bool = False,
+    check_overlap: bool = False,
+):
+    """Create masks of the fraction of each grid cell covered by each feature of a GeoDataFrame.
+
+    Unlike the other masks, which only tell which cell centroids fall in a geometry, the coverage fraction accounts
+    for cells partially covered by a geometry, including geometries smaller than a grid cell. On rectilinear grids,
+    cells crossed by a geometry's boundary are found with vectorized grid line crossings and only those get an
+    exact polygon clipping, cells fully inside or outside are classified from their center. Fractions are
+    computed in the lon/lat plane.
+
+    Parameters
+    ----------
+    x_dim : xarray.DataArray
+      X or longitudinal dimension of xarray object.
+    y_dim : xarray.DataArray
+      Y or latitudinal dimension of xarray object.
+    poly : "gpd.GeoDataFrame"
+      GeoDataFrame used to create the xarray.DataArray mask.
+    x_bnds : Optional[Union[xarray.DataArray, np.ndarray]]
+      Cell bounds of `x_dim`, of shape (n, 2) for 1D coordinates or with the 4 cell vertices as last dimension
+      for 2D coordinates. Inferred from the cell centers for 1D coordinates if not given.
+    y_bnds : Optional[Union[xarray.DataArray, np.ndarray]]
+      Cell bounds of `y_dim`, see `x_bnds`.
+    wrap_lons : bool
+      Shift vector longitudes by -180,180 degrees to 0,360 degrees; Default = False
+    check_overlap: bool
+      Perform a check to verify if shapes contain overlapping geometries.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+      Matrix of shape (len(poly), number of grid cells), row `i` holding the fractions between 0 and 1 of the
+      (flattened) cells covered by the geometry at position `i` in `poly`, like `mask_to_sparse` for label masks.
+      Cells are flattened in the order of the dimensions of the other masks, e.g. (lon, lat) for 1D coordinates.
+      Only the covered cells are stored, nearly all cells being outside of any geometry on large grids.
+
+    Examples
+    --------
+    >>> import geopandas as gpd  # doctest: +SKIP
+    >>> import xarray as xr  # doctest: +SKIP
+    >>> from clisops.core.subset import create_coverage_mask  # doctest: +SKIP
+    >>> ds = xr.open_dataset(path_to_tasmin_file)  # doctest: +SKIP
+    >>> polys = gpd.read_file(path_to_multi_shape_file)  # doctest: +SKIP
+    ...
+    # Weighted mean of each region
+    >>> from clisops.core.regions import aggregate_regions  # doctest: +SKIP
+    >>> frac = create_coverage_mask(x_dim=ds.lon, y_dim=ds.lat, x_bnds=ds.lon_bnds, y_bnds=ds.lat_bnds, poly=polys)  # doctest: +SKIP
+    >>> tn = aggregate_regions(ds.tasmin, frac, spatial_dims=["lon", "lat"], regions=polys.index)  # doctest: +SKIP
+    """
+    if check_overlap:
+        _check_has_overlaps(polygons=poly)
+    if wrap_lons:
+        warnings.warn("Wrapping longitudes at 180 degrees.")
+
+    # Only the covered cells of each region are stored
+    regions, cells, fractions = [], [], []
+    if x_dim.ndim == 1 and y_dim.ndim == 1:
+        shape = (x_dim.size, y_dim.size)
+        x_edges, x_order = cell_edges(x_dim.values, x_bnds)
+        y_edges, y_order = cell_edges(y_dim.values, y_bnds)
+        for i, geom in enumerate(poly.geometry):
+            ii, jj, frac = _coverage_fraction_rectilinear(geom, x_edges, y_edges)
+            regions.append(np.full(frac.size, i))
+            cells.append(np.ravel_multi_index((x_order[ii], y_order[jj]), shape))
+            fractions.append(frac)
+    else:
+        if x_bnds is None or y_bnds is None:
+            raise ValueError(
+                "Coverage fractions on curvilinear grids require the cell vertices in `x_bnds` and `y_bnds`."
+            )
+        shape = x_dim.shape
+        x_vertices = np.asarray(x_bnds).reshape(-1, 4)
+        y_vertices = np.asarray(y_bnds).reshape(-1, 4)
+        for i, geom in enumerate(poly.geometry):
+            cc, frac = _coverage_fraction_cells(geom, x_vertices, y_vertices)
+            regions.append(np.full(frac.size, i))
+            cells.append(cc)
+            fractions.append(frac)
+
+    return sparse.csr_matrix(
+        (
+            np.concatenate([np.empty(0)] + fractions),
+            (
+                np.concatenate([np.empty(0, dtype=int)] + regions),
+                np.concatenate([np.empty(0, dtype=int)] + cells),
+            ),
+        ),
+        shape=(len(poly), int(np.prod(shape))),
+    )
+
+
+def _coverage_fraction_rectilinear(
+    geom, x_edges: np.ndarray, y_edges: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the x and y indices of the cells of a rectilinear grid covered by a geometry, and their fractions."""
+    from shapely import vectorized
+    from shapely.geometry import box
+    from shapely.prepared import prep
+
+    nx, ny = x_edges.size - 1, y_edges.size - 1
+    empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+    if geom is None or geom.is_empty:
+        return empty
+
+    # Only work on the cells within the geometry's bounding box
+    minx, miny, maxx, maxy = geom.bounds
+    i0 = max(np.searchsorted(x_edges, minx, side="right") - 1, 0)
+    i1 = min(np.searchsorted(x_edges, maxx, side="left"), nx)
+    j0 = max(np.searchsorted(y_edges, miny, side="right") - 1, 0)
+    j1 = min(np.searchsorted(y_edges, maxy, side="left"), ny)
+    if i0 >= i1 or j0 >= j1:
+        return empty
+    ex = x_edges[i0 : i1 + 1]
+    ey = y_edges[j0 : j1 + 1]
+
+    # Find the cells crossed by the geometry's boundary: cells containing a vertex and cells on both sides of
+    # every crossing of an edge with a grid line.
+    x0, y0, x1, y1 = _polygon_edges(geom)
+    boundary = np.zeros((ex.size - 1, ey.size - 1), dtype=bool)
+
+    def mark(x, y):
+        for ii in _cells_at(ex, x):
+            for jj in _cells_at(ey, y):
+                valid = (ii >= 0) & (ii < boundary.shape[0])
+                valid &= (jj >= 0) & (jj < boundary.shape[1])
+                boundary[ii[valid], jj[valid]] = True
+
+    mark(x0, y0)
+    for (u0, v0, u1, v1, lines, swap) in [
+        (x0, y0, x1, y1, ex, False),
+        (y0, x0, y1, x1, ey, True),
+    ]:
+        # Grid lines strictly between the ends of each edge
+        a = np.searchsorted(lines, np.minimum(u0, u1), side="right")
+        b = np.searchsorted(lines, np.maximum(u0, u1), side="left")
+        count = np.maximum(b - a, 0)
+        edge = np.repeat(np.arange(count.size), count)
+        k = a[edge] + np.arange(edge.size) - np.repeat(np.cumsum(count) - count, count)
+        u = lines[k]
+        v = v0[edge] + (u - u0[edge]) * (v1[edge] - v0[edge]) / (u1[edge] - u0[edge])
+        if swap:
+            mark(v, u)
+        else:
+            mark(u, v)
+
+    # Cells not crossed by the boundary are either fully inside or fully outside
+    cx = (ex[1:] + ex[:-1]) / 2
+    cy = (ey[1:] + ey[:-1]) / 2
+    cx, cy = np.meshgrid(cx, cy, indexing="ij")
+    inner = ~boundary
+    sub = np.zeros(boundary.shape)
+    sub[inner] = vectorized.contains(prep(geom), cx[inner], cy[inner])
+
+    # Exact clipping for the cells crossed by the boundary
+    for ii, jj in zip(*np.nonzero(boundary)):
+        cell = box(ex[ii], ey[jj], ex[ii + 1], ey[jj + 1])
+        if cell.area > 0:
+            sub[ii, jj] = cell.intersection(geom).area / cell.area
+
+    ii, jj = np.nonzero(sub)
+    return ii + i0, jj + j0, sub[ii, jj]
+
+
+def _cells_at(edges: np.ndarray, values: np.ndarray) -> Sequence[np.ndarray]:
+    """Return the indices of the cells containing the values, and of the previous cells for values on an edge."""
+    ind = np.searchsorted(edges, values, side="right") - 1
+    on_edge = np.isin(values, edges)
+    return [ind, np.where(on_edge, ind - 1, ind)]
+
+
+def _coverage_fraction_cells(
+    geom, x_vertices: np.ndarray, y_vertices: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the indices of the cells, given by their 4 vertices, covered by a geometry, and their fractions."""
+    from shapely.geometry import Polygon
+    from shapely.prepared import prep
+
+    if geom is None or geom.is_empty:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    minx, miny, maxx, maxy = geom.bounds
+    cand = np.flatnonzero(
+        (x_vertices.max(axis=1) >= minx)
+        & (x_vertices.min(axis=1) <= maxx)
+        & (y_vertices.max(axis=1) >= miny)
+        & (y_vertices.min(axis=1) <= maxy)
+    )
+
+    prepared = prep(geom)
+    frac = np.zeros(cand.size)
+    for k, c in enumerate(cand):
+        cell = Polygon(zip(x_vertices[c], y_vertices[c]))
+        if cell.area == 0 or not prepared.intersects(cell):
+            continue
+        if prepared.contains(cell):
+            frac[k] = 1
+        else:
+            frac[k] = cell.intersection(geom).area / cell.area
+    covered = frac > 0
+    return cand[covered], frac[covered]
+
+
+def _mask_dataarray(
+    values: np.ndarray, x_dim: xarray.DataArray, y_dim: xarray.DataArray
+) -> xarray.DataArray:
+    """Wrap mask values in a DataArray with the dimensions and coordinates of the grid."""
+    if x_dim.ndim == 1 and y_dim.ndim == 1:
+        dims_out = x_dim.dims + y_dim.dims
+        coords_out = {dims_out[0]: x_dim.values, dims_out[1]: y_dim.values}
+    else:
+        dims_out = x_dim.dims
+        coords_out = x_dim.coords
+    return xarray.DataArray(values, dims=dims_out, coords=coords_out)
+
+
+_mask_cache = LRUCache(maxsize=8)
+
+
+def _index_bounds(selected: np.ndarray) -> Union[slice, np.ndarray]:
+    """Return the indices of the True values of a 1D boolean array, as a slice if they are contiguous."""
+    ind = np.flatnonzero(selected)
+    if ind.size and ind[-1] - ind[0] + 1 == ind.size:
+        return slice(ind[0], ind[-1] + 1)
+    return ind
+
+
+def _mask_cache_key(
+    x_dim: xarray.DataArray, y_dim: xarray.DataArray, poly: "gpd.GeoDataFrame", **options
+) -> str:
+    """Return a key identifying a mask from the grid coordinates, the geometries and their CRS and the mask options."""
+    h = hashlib.sha1()
+    h.update(hash_arrays(x_dim.values, y_dim.values).encode())
+    h.update(repr(sorted(options.items())).encode())
+    h.update(repr(list(poly.index)).encode())
+    # The CRS of `poly` is ignored by the options when `shape_crs` is given explicitly
+    h.update(repr(None if poly.crs is None else poly.crs.to_wkt()).encode())
+    for geom in poly.geometry:
+        h.update(b"" if geom is None else geom.wkb)
+    return h.hexdigest()
+
+
+def _get_cached_mask(
+    key: str,
+    x_dim: xarray.DataArray,
+    y_dim: xarray.DataArray,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> Optional[xarray.DataArray]:
+    """Return the mask stored under `key` in memory or in `cache_dir`, if any."""
+    mask = _mask_cache.get(key)
+    if mask is None and cache_dir is not None:
+        path = Path(cache_dir) / f"{key}.npz"
+        if path.exists():
+            with np.load(path) as stored:
+                mask = _mask_dataarray(stored["mask"], x_dim, y_dim)
+            _mask_cache.put(key, mask)
+    return mask
+
+
+def _put_cached_mask(
+    key: str, mask: xarray.DataArray, cache_dir: Optional[Union[str, Path]] = None
+):
+    """Store the mask under `key` in memory and in `cache_dir`, if given."""
+    _mask_cache.put(key, mask)
+    if cache_dir is not None:
+        write_atomic(
+            Path(cache_dir) / f"{key}.npz", lambda f: np.savez(f, mask=mask.values)
+        )
+
+
+_shape_cache = LRUCache(maxsize=4)
+
+
+def _lonlat_bbox(
+    lon: xarray.DataArray, lat: xarray.DataArray
+) -> Tuple[float, float, float, float]:
+    """Return the (minx, miny, maxx, maxy) extent of a grid in WGS84 longitudes between -180 and 180."""
+    lon_min, lon_max = float(lon.min()), float(lon.max())
+    if lon_max > 180:
+        if lon_min >= 180:
+            lon_min, lon_max = lon_min - 360, lon_max - 360
+        else:
+            # The grid wraps around the antimeridian once brought back to -180/180
+            lon_min, lon_max = -180.0, 180.0
+    return lon_min, float(lat.min()), lon_max, float(lat.max())
+
+
+def _read_shape(
+    shape: Union[str, Path],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> "gpd.GeoDataFrame":
+    """Read the features of a vector file, only those intersecting `bbox` (in WGS84 degrees) if given.
+
+    Parsed files are cached in memory by path, modification time and bounding box.
+    """
+    import geopandas as gpd
+    from pyproj.crs import CRS
+    from shapely.geometry import box
+
+    try:
+        key = (str(Path(shape).resolve()), os.path.getmtime(shape), bbox)
+    except OSError:
+        # Not a local file (e.g. a URL or an archive member), read it every time
+        key = None
+
+    poly = None if key is None else _shape_cache.get(key)
+    if poly is None:
+        if bbox is None:
+            poly = gpd.read_file(shape)
+        else:
+            # The bounding box is reprojected to the CRS of the file by geopandas
+            poly = gpd.read_file(
+                shape, bbox=gpd.GeoSeries([box(*bbox)], crs=CRS(4326))
+            )
+        if key is not None:
+            _shape_cache.put(key, poly)
+    return poly.copy()
+
+
+def _filter_features(
+    poly: "gpd.GeoDataFrame", feature_filter: Dict[str, Sequence]
+) -> "gpd.GeoDataFrame":
+    """Keep the features whose attributes have one of the given values, for all attributes of `feature_filter`.
+
+    The "index" key selects features by their index, unless the file has an "index" attribute.
+    """
+    keep = np.ones(len(poly), dtype=bool)
+    for name, values in feature_filter.items():
+        if isinstance(values, (str, numbers.Number)):
+            values = [values]
+        if name == "index" and name not in poly.columns:
+            keep &= poly.index.isin(values)
+        elif name in poly.columns:
+            keep &= poly[name].isin(values).values
+        else:
+            raise ValueError(
+                f"Attribute {name} not found in shape. Available attributes: {list(poly.columns)}."
+            )
+    return poly[keep]
+
+
+def _polygon_edges(geom) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the start and end coordinates (x0, y0, x1, y1) of the edges of all rings of a (multi)polygon."""
+    rings = []
+    for part in getattr(geom, "geoms", [geom]):
+        if part.geom_type != "Polygon" or part.is_empty:
+            continue
+        rings.append(np.asarray(part.exterior.coords)[:, :2])
+        rings.extend(np.asarray(ring.coords)[:, :2] for ring in part.interiors)
+
+    if not rings:
+        empty = np.empty(0)
+        return empty, empty, empty, empty
+
+    start = np.concatenate([ring[:-1] for ring in rings])
+    end = np.concatenate([ring[1:] for ring in rings])
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1]
+
+
+def _scanline_fill(
+    edges: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    x: np.ndarray,
+    y: np.ndarray,
+) -> np.ndarray:
+    """Return a (y.size, x.size) boolean array of the points inside the rings, using the even-odd rule.
+
+    `x` must be sorted in increasing order. For every row, the crossings of the edges with the row are sorted and
+    the points between consecutive pairs of crossings are filled with a cumulative sum over the row.
+    """
+    x0, y0, x1, y1 = edges
+    inside = np.zeros((y.size, x.size), dtype=bool)
+
+    # Bound the size of the (edges, rows) temporaries
+    step = max(1, 10_000_000 // max(x0.size, 1))
+    for r in range(0, y.size, step):
+        rows = y[np.newaxis, r : r + step]
+        crosses = (y0[:, np.newaxis] > rows) != (y1[:, np.newaxis] > rows)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xc = x0[:, np.newaxis] + (rows - y0[:, np.newaxis]) * (
+                (x1 - x0) / (y1 - y0)
+            )[:, np.newaxis]
+        xc = np.sort(np.where(crosses, xc, np.nan), axis=0)
+        if xc.shape[0] % 2:
+            xc = np.concatenate([xc, np.full((1, xc.shape[1]), np.nan)])
+
+        start, end = xc[0::2], xc[1::2]
+        valid = ~np.isnan(start) & ~np.isnan(end)
+        row_ind = np.broadcast_to(np.arange(rows.size), start.shape)[valid]
+
+        diff = np.zeros((rows.size, x.size + 1), dtype=int)
+        np.add.at(diff, (row_ind, np.searchsorted(x, start[valid], side="left")), 1)
+        np.add.at(diff, (row_ind, np.searchsorted(x, end[valid], side="left")), -1)
+        inside[r : r + step] = np.cumsum(diff[:, :-1], axis=1) > 0
+
+    return inside
+
+
+def _rasterize(x: np.ndarray, y: np.ndarray, poly: "gpd.GeoDataFrame") -> np.ndarray:
+    """Burn the position of the last geometry of `poly` containing each point into an (x.size, y.size) array.
+
+    Points outside of all geometries are set to -1, later geometries being written over earlier ones.
+    """
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+    labels = np.full((y.size, x.size), -1, dtype=_label_dtype(len(poly)))
+
+    for i, geom in enumerate(poly.geometry):
+        if geom is None or geom.is_empty:
+            continue
+        minx, miny, maxx, maxy = geom.bounds
+        rows = np.flatnonzero((y >= miny) & (y <= maxy))
+        c0 = np.searchsorted(xs, minx, side="left")
+        c1 = np.searchsorted(xs, maxx, side="right")
+        if rows.size == 0 or c0 == c1:
+            continue
+
+        inside = _scanline_fill(_polygon_edges(geom), xs[c0:c1], y[rows])
+        block = labels[rows, c0:c1]
+        block[inside] = i
+        labels[rows, c0:c1] = block
+
+    out = np.empty_like(labels)
+    out[:, order] = labels
+    return out.T
+
+
 @check_latlon_dimnames
 def subset_shape(
     ds: Union[xarray.DataArray, xarray.Dataset],
-    shape: Union[str, Path, gpd.GeoDataFrame],
+    shape: Union[str, Path, "gpd.GeoDataFrame"],
     vectorize: bool = True,
+    rasterize: bool = False,
     raster_crs: Optional[Union[str, int]] = None,
     shape_crs: Optional[Union[str, int]] = None,
     buffer: Optional[Union[int, float]] = None,
@@ -596,7 +1156,10 @@ def subset_shape(
     end_date: Optional[str] = None,
     first_level: Optional[Union[float, int]] = None,
     last_level: Optional[Union[float, int]] = None,
-) -> Union[xarray.DataArray, xarray.Dataset]:
+    mask_cache_dir: Optional[Union[str, Path]] = None,
+    feature_filter: Optional[Dict[str, Sequence]] = None,
+    split_by_feature: bool = False,
+) -> Union[xarray.DataArray, xarray.Dataset, Dict]:
     """Subset a DataArray or Dataset spatially (and temporally) using a vector shape and date selection.
 
     Return a subset of a DataArray or Dataset for grid points falling within the area of a Polygon and/or
@@ -606,10 +1169,13 @@ def subset_shape(
     ----------
     ds : Union[xarray.DataArray, xarray.Dataset]
       Input values.
-    shape : Union[str, Path, gpd.GeoDataFrame]
+    shape : Union[str, Path, "gpd.GeoDataFrame"]
       Path to shape file, or directly a geodataframe. Supports formats compatible with geopandas.
     vectorize: bool
       Whether to use the spatialjoin or vectorize backend.
+    rasterize: bool
+      Use the scanline rasterization backend on rectilinear grids, much faster for high resolution grids.
+      Curvilinear grids fall back to the backend selected with `vectorize`.
     raster_crs : Optional[Union[str, int]]
       EPSG number or PROJ4 string.
     shape_crs : Optional[Union[str, int]]
@@ -632,11 +1198,23 @@ def subset_shape(
       Last level of the subset.
       Can be either an integer or float.
       Defaults to last level of input data-array.
+    mask_cache_dir : Optional[Union[str, Path]]
+      Directory where masks are stored and looked up, so they can be reused across processes and sessions.
+      Masks are always cached in memory for the most recently used grids and shapes.
+    feature_filter : Optional[Dict[str, Sequence]]
+      Only use the features whose attributes have one of the given values, e.g. `{"NAME": ["Quebec", "Ontario"]}`.
+      The "index" key selects features by their index in the shape.
+    split_by_feature : bool
+      Return one subset per feature instead of a single subset for all features. A single mask is computed for all
+      features and each subset is cropped to its feature, the subsets sharing the same (lazy) input data. Features
+      overlapping others get their cells from separate masks, so that cells shared by nested or overlapping
+      features are part of the subsets of all of them.
 
     Returns
     -------
-    Union[xarray.DataArray, xarray.Dataset]
-      A subset of `ds`
+    Union[xarray.DataArray, xarray.Dataset, Dict]
+      A subset of `ds`, or a dictionary of subsets keyed by the index of the features with `split_by_feature=True`.
+      Features not containing any grid cell centroid are left out.
 
     Examples
     --------
@@ -653,22 +1231,47 @@ def subset_shape(
     # Subset multiple variables in a single dataset
     >>> ds = xr.open_mfdataset([path_to_tasmin_file, path_to_tasmax_file])  # doctest: +SKIP
     >>> dsSub = subset_shape(ds, shape=path_to_shape_file)  # doctest: +SKIP
+    ...
+    # Subset by a few features of a large shape file
+    >>> dsSub = subset_shape(ds, shape=path_to_admin_file, feature_filter={"NAME": ["Quebec"]})  # doctest: +SKIP
+    ...
+    # One subset per feature, in a single pass
+    >>> subs = subset_shape(ds, shape=path_to_multi_shape_file, split_by_feature=True)  # doctest: +SKIP
+    >>> from clisops.utils.file_namers import SimpleFileNamer  # doctest: +SKIP
+    >>> from clisops.utils.output_utils import get_outputs  # doctest: +SKIP
+    >>> paths = get_outputs(list(subs.values()), "netcdf", output_dir, SimpleFileNamer())  # doctest: +SKIP
     """
+    import geopandas as gpd
+    from pyproj.crs import CRS
+
     wgs84 = CRS(4326)
     # PROJ4 definition for WGS84 with longitudes ranged between -180/+180.
     wgs84_wrapped = CRS.from_string(
         "+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs lon_wrap=180"
     )
 
+    # The input is never modified: all the steps below return new objects.
     if isinstance(ds, xarray.DataArray):
-        ds_copy = ds._to_temp_dataset()
+        ds_sub = ds._to_temp_dataset()
     else:
-        ds_copy = ds.copy()
+        ds_sub = ds
 
     if isinstance(shape, gpd.GeoDataFrame):
         poly = shape.copy()
     else:
-        poly = gpd.GeoDataFrame.from_file(shape)
+        # Only read the features overlapping the grid, unless a buffer could bring more features in reach
+        bbox = None
+        if raster_crs is None and buffer is None:
+            bbox = _lonlat_bbox(ds_sub.lon, ds_sub.lat)
+        poly = _read_shape(shape, bbox=bbox)
+
+    if feature_filter is not None:
+        poly = _filter_features(poly, feature_filter)
+
+    if len(poly) == 0:
+        raise ValueError(
+            "No features found in provided shape overlapping the grid or matching the feature filter."
+        )
 
     if buffer is not None:
         poly.geometry = poly.buffer(buffer)
@@ -681,21 +1284,21 @@ def subset_shape(
     # If polygon doesn't cross prime meridian, subset bbox first to reduce processing time
     # Only case not implemented is when lon_bnds cross the 0 deg meridian but dataset grid has all positive lons
     try:
-        ds_copy = subset_bbox(ds_copy, lon_bnds=lon_bnds, lat_bnds=lat_bnds)
+        ds_sub = subset_bbox(ds_sub, lon_bnds=lon_bnds, lat_bnds=lat_bnds)
     except NotImplementedError:
         pass
 
-    if ds_copy.lon.size == 0 or ds_copy.lat.size == 0:
+    if ds_sub.lon.size == 0 or ds_sub.lat.size == 0:
         raise ValueError(
             "No grid cell centroids found within provided polygon bounding box. "
             'Try using the "buffer" option to create an expanded area.'
         )
 
     if start_date or end_date:
-        ds_copy = subset_time(ds_copy, start_date=start_date, end_date=end_date)
+        ds_sub = subset_time(ds_sub, start_date=start_date, end_date=end_date)
 
     if first_level or last_level:
-        ds_copy = subset_level(ds_copy, first_level=first_level, last_level=last_level)
+        ds_sub = subset_level(ds_sub, first_level=first_level, last_level=last_level)
 
     # Determine whether CRS types are the same between shape and raster
     if shape_crs is not None:
@@ -720,53 +1323,136 @@ def subset_shape(
 
         try:
             # Extract CF-compliant CRS_WKT from crs variable.
-            raster_crs = CRS.from_cf(ds_copy.crs.attrs)
+            raster_crs = CRS.from_cf(ds_sub.crs.attrs)
         except AttributeError:
-            if np.min(ds_copy.lon) >= 0 and np.max(ds_copy.lon) <= 360:
+            if np.min(ds_sub.lon) >= 0 and np.max(ds_sub.lon) <= 360:
                 wrap_lons = True
                 raster_crs = wgs84_wrapped
             else:
                 raster_crs = wgs84
     _check_crs_compatibility(shape_crs=shape_crs, raster_crs=raster_crs)
 
-    # Create mask using the vectorize or spatial join methods.
-    if vectorize:
-        mask_2d = create_mask_vectorize(
-            x_dim=ds_copy.lon, y_dim=ds_copy.lat, poly=poly, wrap_lons=wrap_lons
-        )
+    # Create mask using the rasterize, vectorize or spatial join methods.
+    if rasterize and ds_sub.lon.ndim == 1 and ds_sub.lat.ndim == 1:
+        method = create_mask_rasterize
+    elif vectorize:
+        method = create_mask_vectorize
     else:
-        mask_2d = create_mask(
-            x_dim=ds_copy.lon, y_dim=ds_copy.lat, poly=poly, wrap_lons=wrap_lons
+        method = create_mask
+
+    def get_mask(features):
+        # Reuse the mask if it was already computed for the same grid, shapes and options.
+        mask_key = _mask_cache_key(
+            ds_sub.lon,
+            ds_sub.lat,
+            features,
+            method=method.__name__,
+            raster_crs=raster_crs.to_wkt(),
+            shape_crs=shape_crs.to_wkt(),
+            wrap_lons=wrap_lons,
+            buffer=buffer,
+            as_labels=True,
         )
+        mask = _get_cached_mask(mask_key, ds_sub.lon, ds_sub.lat, mask_cache_dir)
+        if mask is None:
+            mask = method(
+                x_dim=ds_sub.lon,
+                y_dim=ds_sub.lat,
+                poly=features,
+                wrap_lons=wrap_lons,
+                as_labels=True,
+            )
+            _put_cached_mask(mask_key, mask, mask_cache_dir)
+        return mask
 
-    if np.all(mask_2d.isnull()):
+    mask_2d = get_mask(poly)
+    inside = mask_2d >= 0
+    if not inside.any():
         raise ValueError(
             f"No grid cell centroids found within provided polygon bounds ({poly.bounds}). "
             'Try using the "buffer" option to create an expanded areas or verify polygon.'
         )
 
-    # loop through variables
-    for v in ds_copy.data_vars:
-        if set.issubset(set(mask_2d.dims), set(ds_copy[v].dims)):
-            ds_copy[v] = ds_copy[v].where(mask_2d.notnull())
+    if not split_by_feature:
+        ds_sub = _apply_shape_mask(ds_sub, inside, raster_crs)
+        if isinstance(ds, xarray.DataArray):
+            return ds._from_temp_dataset(ds_sub)
+        return ds_sub
+
+    # One subset per feature, each cropped to the index bounding box of its cells in a shared label mask. A label
+    # mask holds a single feature per cell, so overlapping features get their cells from separate masks.
+    layers = _overlap_layers(poly)
+    feature_masks = {}
+    for positions in layers:
+        layer_mask = mask_2d if len(layers) == 1 else get_mask(poly.iloc[positions])
+        cells = mask_to_sparse(layer_mask.values, n_regions=len(positions))
+        for label, i in enumerate(positions):
+            flat = cells.indices[cells.indptr[label] : cells.indptr[label + 1]]
+            feature_masks[i] = (layer_mask, label, flat)
+
+    out = {}
+    empty = []
+    for i, name in enumerate(poly.index):
+        layer_mask, label, flat = feature_masks[i]
+        if flat.size == 0:
+            empty.append(name)
+            continue
+        indexers = {
+            dim: slice(ind.min(), ind.max() + 1)
+            for dim, ind in zip(
+                layer_mask.dims, np.unravel_index(flat, layer_mask.shape)
+            )
+        }
+        feature_ds = _apply_shape_mask(
+            ds_sub.isel(indexers), layer_mask.isel(indexers) == label, raster_crs
+        )
+        if isinstance(ds, xarray.DataArray):
+            feature_ds = ds._from_temp_dataset(feature_ds)
+        out[name] = feature_ds
+
+    if empty:
+        warnings.warn(
+            f"No grid cell centroids found within features {empty}. They are not part of the output.",
+            UserWarning,
+            stacklevel=2,
+        )
+    return out
 
-    # Remove coordinates where all values are outside of region mask
-    for dim in mask_2d.dims:
-        mask_2d = mask_2d.dropna(dim, how="all")
-    ds_copy = ds_copy.sel({dim: mask_2d[dim] for dim in mask_2d.dims})
+
+def _apply_shape_mask(
+    ds: xarray.Dataset, inside: xarray.DataArray, raster_crs: "CRS"
+) -> xarray.Dataset:
+    """Crop a Dataset to the cells selected by a boolean mask, mask its gridded variables and add the CRS."""
+    # Crop to the index bounding box of the mask before masking, so that masking only touches the region.
+    indexers = {
+        dim: _index_bounds(
+            inside.any(dim=[d for d in inside.dims if d != dim]).values
+        )
+        for dim in inside.dims
+    }
+    ds = ds.isel(indexers)
+    inside = inside.isel(indexers)
+
+    # Mask lazily the variables sharing the spatial dimensions, leaving the others and the coordinates as they are.
+    spatial_dims = set(inside.dims)
+    ds = ds.assign(
+        {
+            name: da.where(inside)
+            for name, da in ds.data_vars.items()
+            if spatial_dims.issubset(da.dims)
+        }
+    )
 
     # Add a CRS definition using CF conventions and as a global attribute in CRS_WKT for reference purposes
-    ds_copy.attrs["crs"] = raster_crs.to_string()
-    ds_copy["crs"] = 1
-    ds_copy["crs"].attrs.update(raster_crs.to_cf())
+    ds.attrs["crs"] = raster_crs.to_string()
+    ds["crs"] = 1
+    ds["crs"].attrs.update(raster_crs.to_cf())
 
-    for v in ds_copy.variables:
-        if {"lat", "lon"}.issubset(set(ds_copy[v].dims)):
-            ds_copy[v].attrs["grid_mapping"] = "crs"
+    for v in ds.variables:
+        if {"lat", "lon"}.issubset(set(ds[v].dims)):
+            ds[v].attrs["grid_mapping"] = "crs"
 
-    if isinstance(ds, xarray.DataArray):
-        return ds._from_temp_dataset(ds_copy)
-    return ds_copy
+    return ds
 
 
 @check_latlon_dimnames
@@ -942,32 +1628,79 @@ def _check_desc_coords(coord, bounds, dim):
     return bounds
 
 
-def _check_has_overlaps(polygons: gpd.GeoDataFrame):
-    non_overlapping = []
-    for n, p in enumerate(polygons["geometry"][:-1], 1):
-        if not any(p.overlaps(g) for g in polygons["geometry"][n:]):
-            non_overlapping.append(p)
-    if len(polygons) != len(non_overlapping):
+def _overlapping_pairs(polygons: "gpd.GeoDataFrame") -> list:
+    """Return the (index, index) pairs of features whose interiors intersect.
+
+    Candidate pairs are found by querying an STRtree of the geometries with the bounds of each geometry, and only
+    those are tested exactly.
+    """
+    from shapely.strtree import STRtree
+
+    geoms = [
+        (name, geom)
+        for name, geom in zip(polygons.index, polygons.geometry)
+        if geom is not None and not geom.is_empty
+    ]
+    if len(geoms) < 2:
+        return []
+    tree = STRtree([geom for _, geom in geoms])
+    position = {id(geom): i for i, (_, geom) in enumerate(geoms)}
+
+    pairs = []
+    for i, (_, geom) in enumerate(geoms):
+        for found in tree.query(geom):
+            # Shapely >= 2 returns the positions of the geometries in the tree, older versions the geometries
+            if isinstance(found, numbers.Integral):
+                j = int(found)
+            else:
+                j = position[id(found)]
+            # The first DE-9IM entry is the dimension of the intersection of the interiors.
+            if j > i and geom.relate(geoms[j][1])[0] != "F":
+                pairs.append((i, j))
+    return [(geoms[i][0], geoms[j][0]) for i, j in sorted(pairs)]
+
+
+def _overlap_layers(polygons: "gpd.GeoDataFrame") -> List[List[int]]:
+    """Split the positions of the features into groups without overlapping features.
+
+    Features are assigned in order to the first group where they don't overlap any other feature, so features
+    without overlaps are all in the first group.
+    """
+    pairs = _overlapping_pairs(polygons.reset_index(drop=True))
+    neighbours = {}
+    for i, j in pairs:
+        neighbours.setdefault(i, set()).add(j)
+        neighbours.setdefault(j, set()).add(i)
+
+    layers = []
+    layer_of = {}
+    for i in range(len(polygons)):
+        used = {layer_of[j] for j in neighbours.get(i, ()) if j in layer_of}
+        layer = min(set(range(len(layers) + 1)) - used)
+        if layer == len(layers):
+            layers.append([])
+        layers[layer].append(i)
+        layer_of[i] = layer
+    return layers
+
+
+def _check_has_overlaps(polygons: "gpd.GeoDataFrame"):
+    pairs = _overlapping_pairs(polygons)
+    if pairs:
+        listed = ", ".join(f"({a}, {b})" for a, b in pairs[:10])
+        if len(pairs) > 10:
+            listed += f" and {len(pairs) - 10} more"
         warnings.warn(
-            "List of shapes contains overlap between features. Results will vary on feature order.",
+            f"List of shapes contains overlap between features {listed}. Results will vary on feature order.",
             UserWarning,
             stacklevel=5,
         )
 
 
-def _check_has_overlaps_old(polygons: gpd.GeoDataFrame):
-    for i, (inda, pola) in enumerate(polygons.iterrows()):
-        for (indb, polb) in polygons.iloc[i + 1 :].iterrows():
-            if pola.geometry.intersects(polb.geometry):
-                warnings.warn(
-                    f"List of shapes contains overlap between {inda} and {indb}. Points will be assigned to {inda}.",
-                    UserWarning,
-                    stacklevel=5,
-                )
-
-
-def _check_crs_compatibility(shape_crs: CRS, raster_crs: CRS):
+def _check_crs_compatibility(shape_crs: "CRS", raster_crs: "CRS"):
     """If CRS definitions are not WGS84 or incompatible, raise operation warnings."""
+    from pyproj.crs import CRS
+
     wgs84 = CRS(4326)
     if not shape_crs.equals(raster_crs):
         if (
@@ -1000,6 +1733,7 @@ def subset_gridpoint(
     last_level: Optional[Union[float, int]] = None,
     tolerance: Optional[float] = None,
     add_distance: bool = False,
+    method: str = "geodesic",
 ) -> Union[xarray.DataArray, xarray.Dataset]:
     """Extract one or more nearest gridpoint(s) from datarray based on lat lon coordinate(s).
 
@@ -1035,6 +1769,8 @@ def subset_gridpoint(
     tolerance : Optional[float]
       Masks values if the distance to the nearest gridpoint is larger than tolerance in meters.
     add_distance: bool
+    method : str
+      Method used to compute distances, "geodesic" (WGS84 ellipsoid) or "haversine" (sphere). See `distance`.
 
     Returns
     -------
@@ -1069,27 +1805,27 @@ def subset_gridpoint(
 
             if tolerance is not None or add_distance:
                 # Calculate the geodesic distance between grid points and the point of interest.
-                dist = distance(da, lon=lon, lat=lat)
+                dist = distance(da, lon=lon, lat=lat, method=method)
             else:
                 dist = None
 
         else:
-            # Calculate the geodesic distance between grid points and the point of interest.
-            dist = distance(da, lon=lon, lat=lat)
-            pts = []
-            dists = []
-            for site in dist[ptdim]:
-                # Find the indices for the closest point
-                inds = np.unravel_index(
-                    dist.sel({ptdim: site}).argmin(), dist.sel({ptdim: site}).shape
-                )
+            # Find the closest grid points using a spatial index built once per grid.
+            lon_grid, lat_grid = xarray.broadcast(da.lon, da.lat)
+            lat_grid = lat_grid.transpose(*lon_grid.dims)
+            inds, dists = _nearest_gridpoints(
+                lon_grid.values, lat_grid.values, lon.values, lat.values, method=method
+            )
 
-                # Select data from closest point
-                args = {xydim: ind for xydim, ind in zip(dist.dims, inds)}
-                pts.append(da.isel(**args))
-                dists.append(dist.isel(**args))
-            da = xarray.concat(pts, dim=ptdim)
-            dist = xarray.concat(dists, dim=ptdim)
+            # Select data from all closest points at once with pointwise indexing
+            args = {
+                xydim: xarray.DataArray(ind, dims=(ptdim,))
+                for xydim, ind in zip(
+                    lon_grid.dims, np.unravel_index(inds, lon_grid.shape)
+                )
+            }
+            da = da.isel(**args)
+            dist = xarray.DataArray(dists, dims=(ptdim,), attrs={"units": "m"})
     else:
         raise (
             Exception(
@@ -1228,6 +1964,9 @@ def distance(
     *,
     lon: Union[float, Sequence[float], xarray.DataArray],
     lat: Union[float, Sequence[float], xarray.DataArray],
+    method: str = "geodesic",
+    memory_limit: Optional[Union[int, str]] = None,
+    argmin: bool = False,
 ):
     """Return distance to a point in meters.
 
@@ -1239,11 +1978,22 @@ def distance(
       Longitude coordinate.
     lat : Union[float, Sequence[float], xarray.DataArray]
       Latitude coordinate.
+    method : str
+      "geodesic" for the distance on the WGS84 ellipsoid or "haversine" for the much faster great-circle distance
+      on a sphere of the mean Earth radius (within ~0.5% of the geodesic distance).
+    memory_limit : Optional[Union[int, str]]
+      Upper bound for the temporary arrays, in bytes or as a size string (e.g. "250MiB"). When given, distances
+      are computed for blocks of sites at a time, and the full distance field is returned as a dask array chunked
+      along the sites, each chunk being computed within the limit. Defaults to computing all sites at once.
+    argmin : bool
+      If True, only return the flat index of the closest grid point and the distance to it for each site,
+      instead of the full distance field.
 
     Returns
     -------
-    xarray.DataArray
-      Distance in meters to point.
+    Union[xarray.DataArray, xarray.Dataset]
+      Distance in meters to point. If `argmin` is True, a Dataset with the minimum "distance" and the "index" of
+      the closest grid point (flattened over the dimensions of `da.lon`) for each site.
 
     Examples
     --------
@@ -1255,19 +2005,140 @@ def distance(
     >>> d = distance(da, lon=-75, lat=45)  # doctest: +SKIP
     >>> k = d.argmin()  # doctest: +SKIP
     >>> i, j, _ = np.unravel_index(k, d.shape)  # doctest: +SKIP
+    ...
+    Or, without building the full distance field:
+    >>> d = distance(da, lon=[-75, -70], lat=[45, 46], argmin=True, memory_limit="250MiB")  # doctest: +SKIP
+    >>> i, j = np.unravel_index(d.index, da.lon.shape)  # doctest: +SKIP
     """
     ptdim = lat.dims[0]
 
-    g = Geod(ellps="WGS84")  # WGS84 ellipsoid - decent globally
+    dist_func = _get_distance_func(method)
+
+    lon_grid, lat_grid = xarray.broadcast(da.lon.load(), da.lat.load())
+    lat_grid = lat_grid.transpose(*lon_grid.dims)
+    step = _sites_per_block(lon_grid.size, lon.size, memory_limit)
+
+    if argmin:
+        lons = np.ravel(lon_grid.values)[:, np.newaxis]
+        lats = np.ravel(lat_grid.values)[:, np.newaxis]
+        index = np.empty(lon.size, dtype=int)
+        dmin = np.empty(lon.size)
+        for i in range(0, lon.size, step):
+            sl = slice(i, i + step)
+            d = dist_func(
+                *np.broadcast_arrays(
+                    lons, lats, lon.values[np.newaxis, sl], lat.values[np.newaxis, sl]
+                )
+            )
+            index[sl] = np.nanargmin(d, axis=0)
+            dmin[sl] = d[index[sl], np.arange(d.shape[1])]
+
+        return xarray.Dataset(
+            {
+                "distance": xarray.DataArray(dmin, dims=(ptdim,), attrs={"units": "m"}),
+                "index": xarray.DataArray(index, dims=(ptdim,)),
+            }
+        )
+
+    def func(*args):
+        return dist_func(*np.broadcast_arrays(*args))
 
-    def func(lons, lats, lon, lat):
-        return g.inv(lons, lats, lon, lat)[2]
+    if memory_limit is not None:
+        # Lazy distance field, each chunk of sites being computed within the memory limit
+        lon = lon.chunk({ptdim: step})
+        lat = lat.chunk({ptdim: step})
 
     out = xarray.apply_ufunc(
         func,
-        *xarray.broadcast(da.lon.load(), da.lat.load(), lon, lat),
-        input_core_dims=[[ptdim]] * 4,
-        output_core_dims=[[ptdim]],
+        lon_grid,
+        lat_grid,
+        lon,
+        lat,
+        dask="parallelized",
+        output_dtypes=[float],
     )
     out.attrs["units"] = "m"
     return out
+
+
+def _sites_per_block(
+    grid_size: int, n_sites: int, memory_limit: Optional[Union[int, str]]
+) -> int:
+    """Number of sites for which distances to all grid points fit within the memory limit."""
+    if memory_limit is None:
+        return max(n_sites, 1)
+    if isinstance(memory_limit, str):
+        memory_limit = parse_size(memory_limit)
+    # Geod.inv works on float64 copies of its 4 inputs and returns 3 arrays of the same size,
+    # which is also an upper bound for the haversine temporaries.
+    return int(max(1, memory_limit // (7 * 8 * max(grid_size, 1))))
+
+
+# Mean Earth radius (m), IUGG
+_EARTH_RADIUS = 6371008.8
+
+
+def _haversine(lons1, lats1, lons2, lats2):
+    """Great-circle distance in meters between points given in degrees."""
+    lons1, lats1, lons2, lats2 = map(np.deg2rad, (lons1, lats1, lons2, lats2))
+    a = (
+        np.sin((lats2 - lats1) / 2) ** 2
+        + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _get_distance_func(method: str):
+    """Return a function computing distances in meters between (lons1, lats1) and (lons2, lats2)."""
+    from pyproj import Geod
+
+    if method == "geodesic":
+        g = Geod(ellps="WGS84")  # WGS84 ellipsoid - decent globally
+
+        def func(lons1, lats1, lons2, lats2):
+            return g.inv(lons1, lats1, lons2, lats2)[2]
+
+        return func
+    if method == "haversine":
+        return _haversine
+    raise ValueError(
+        f'Distance method "{method}" not recognised. Must be one of "geodesic" or "haversine".'
+    )
+
+
+def _nearest_gridpoints(
+    lon_grid: np.ndarray,
+    lat_grid: np.ndarray,
+    lon: np.ndarray,
+    lat: np.ndarray,
+    k: int = 8,
+    method: str = "geodesic",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the grid point closest to each site.
+
+    The `k` nearest candidates are taken from the spatial index and the distance (see `distance` for the
+    available methods) is only computed for those candidates to pick the closest one.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+      Flat indices into the grid and distances in meters, one per site.
+    """
+    tree, valid = get_spatial_index(lon_grid, lat_grid)
+    lon = np.atleast_1d(lon).astype(float)
+    lat = np.atleast_1d(lat).astype(float)
+    k = min(k, valid.size)
+
+    _, cand = tree.query(lonlat_to_xyz(lon, lat), k=k)
+    cand = valid[np.reshape(cand, (lon.size, k))]
+
+    dists = _get_distance_func(method)(
+        np.ravel(lon_grid)[cand],
+        np.ravel(lat_grid)[cand],
+        np.repeat(lon[:, np.newaxis], k, axis=1),
+        np.repeat(lat[:, np.newaxis], k, axis=1),
+    )
+
+    best = np.argmin(dists, axis=1)
+    sites = np.arange(lon.size)
+    return cand[sites, best], dists[sites, best]
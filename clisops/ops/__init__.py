@@ -1 +1,4 @@
+from .average import average_over_dims
+from .regrid import regrid
+from .resample import climatology, resample
 from .subset import subset
@@ -0,0 +1,90 @@
+from clisops import logging
+from clisops.core import average
+from clisops.ops.subset import _get_subset_args, _subset
+from clisops.utils.file_namers import get_file_namer
+from clisops.utils.output_utils import get_chunked_input, get_split_outputs
+
+__all__ = [
+    "average_over_dims",
+]
+
+LOGGER = logging.getLogger(__file__)
+
+
+def _parse_dims(dims):
+    if isinstance(dims, str):
+        return [dim.strip() for dim in dims.split(",") if dim.strip()]
+    return list(dims) if dims else dims
+
+
+def average_over_dims(
+    ds,
+    dims=None,
+    ignore_undetected_dims=False,
+    area_weighted=True,
+    time=None,
+    area=None,
+    level=None,
+    shape=None,
+    output_dir=None,
+    output_type="netcdf",
+    split_method="time:auto",
+    file_namer="standard",
+):
+    """
+    Example:
+        ds: Xarray Dataset
+        dims: ["latitude", "longitude"]
+        ignore_undetected_dims: False
+        area_weighted: True
+        time: ("1999-01-01T00:00:00", "2100-12-30T00:00:00")
+        area: (-5.,49.,10.,65)
+        level: (1000.,)
+        shape: None
+        output_dir: "/cache/wps/procs/req0111"
+        output_type: "netcdf"
+        split_method: "time:auto"
+        file_namer: "standard"
+
+    The average is computed lazily, chunk by chunk, and only the (much smaller)
+    result is written. Outputs keeping a time dimension are split like `subset`
+    outputs, others are written to a single file.
+
+    The input can first be subset with the `time`, `area`, `level` and `shape`
+    parameters of `subset`. The subset is part of the same computation as the
+    average: only the selected chunks are read and nothing else is written.
+
+    :param ds: Dataset, or path(s) to the files to open
+    :param dims: types of the coordinates to average over, among "time", "level",
+        "latitude" and "longitude", as a sequence or a comma-separated string
+    :param ignore_undetected_dims: ignore requested dimensions not found in `ds`
+    :param area_weighted: weight averages over latitude and longitude by the cell
+        areas, from an "areacella" variable, the coordinate bounds or cos(lat)
+    :param time: time range to subset to before averaging
+    :param area: bounding box to subset to before averaging
+    :param level: level range to subset to before averaging
+    :param shape: path to a shape file, or a GeoDataFrame, to subset to before
+        averaging, instead of `area`. Cells outside of the shape are ignored.
+    :param output_dir:
+    :param output_type:
+    :param split_method:
+    :param file_namer:
+    :return: list of outputs
+    """
+    request = ("average_over_dims", ds, dims, ignore_undetected_dims, area_weighted)
+    request += (time, area, level, shape, output_type, split_method)
+    ds = get_chunked_input(ds)
+
+    if any(param is not None for param in [time, area, level, shape]):
+        args = _get_subset_args(ds, time, area, level, shape)
+        ds = _subset(ds, args)
+
+    dims = _parse_dims(dims)
+    LOGGER.debug(f"Averaging over dimensions: {dims}")
+    avg_ds = average.average_over_dims(
+        ds, dims, ignore_undetected_dims, area_weighted=area_weighted
+    )
+
+    namer = get_file_namer(file_namer)(request=request)
+    return get_split_outputs(avg_ds, output_type, output_dir, split_method, namer)
+
@@ -0,0 +1,176 @@
+import glob
+import multiprocessing
+import multiprocessing.util
+import os
+
+import xarray as xr
+
+from clisops import CONFIG, logging
+from clisops.exceptions import InvalidParameterValue
+from clisops.ops.subset import subset
+from clisops.utils.cache_utils import LRUCache
+
+__all__ = [
+    "SubsetPool",
+]
+
+LOGGER = logging.getLogger(__file__)
+
+# Datasets opened by the current worker process, by input files
+_datasets = None
+
+
+def _close_dataset(ds):
+    try:
+        ds.close()
+    except Exception as exc:
+        LOGGER.warning(f"Failed to close dataset: {exc}")
+
+
+def _init_worker(cache_size):
+    """
+    Read the configuration once per worker, clisops being imported when the
+    worker loads this module, so that requests only pay for their own work.
+    """
+    global _datasets
+
+    CONFIG["clisops:read"]
+    _datasets = LRUCache(maxsize=cache_size, on_evict=_close_dataset)
+    # Close the files before the interpreter of the worker shuts down
+    multiprocessing.util.Finalize(
+        None, _close_datasets, args=(_datasets,), exitpriority=10
+    )
+
+
+def _close_datasets(cache):
+    cache.evict_all()
+
+
+def _dataset_key(ds):
+    """
+    Return the files matched by the path(s) `ds` with their modification times,
+    so that files rewritten since they were opened are opened again.
+    """
+    paths = [ds] if isinstance(ds, str) else list(ds)
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.expanduser(path))) or [path])
+
+    try:
+        return tuple((f, os.path.getmtime(f)) for f in files)
+    except OSError:
+        # e.g. a URL
+        return tuple(files)
+
+
+def _open_dataset(ds):
+    """Open the path(s) `ds` like `subset` does, reusing the datasets already opened by this worker."""
+    key = _dataset_key(ds)
+    opened = _datasets.get(key)
+    if opened is None:
+        LOGGER.debug(f"Opening dataset: {ds}")
+        opened = xr.open_mfdataset(ds, use_cftime=True, combine="by_coords")
+        _datasets.put(key, opened)
+
+    return opened
+
+
+def _run_subset(request):
+    kwargs = dict(request)
+    ds = kwargs.pop("ds")
+    return subset(_open_dataset(ds), **kwargs)
+
+
+class SubsetPool(object):
+    """
+    Pool of long-lived worker processes running `subset` requests.
+
+    Each worker is started once with clisops imported and its configuration
+    read, and keeps the datasets it opened in a cache, so that many small
+    requests on the same inputs don't each pay for the imports and for opening
+    the files. Requests are sent to the workers over local queues and the paths
+    of the output files are returned.
+
+    Workers are started with the "spawn" method, so that they don't inherit
+    open files or locks from the parent process.
+
+    Example:
+        with SubsetPool(processes=4) as pool:
+            outputs = pool.map(
+                [
+                    {"ds": path, "time": ("2000-01-01", "2000-12-30"), "output_dir": out}
+                    for path in paths
+                ]
+            )
+
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param cache_size: number of opened datasets kept by each worker
+    :param maxtasksperchild: number of requests after which a worker is replaced,
+        e.g. to bound its memory use. Workers are never replaced by default.
+    """
+
+    def __init__(self, processes=None, cache_size=8, maxtasksperchild=None):
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(cache_size,),
+            maxtasksperchild=maxtasksperchild,
+        )
+
+    def _check_request(self, request):
+        if "ds" not in request:
+            raise InvalidParameterValue("Subset requests must include 'ds'.")
+
+        if not isinstance(request["ds"], (str, list, tuple)):
+            raise InvalidParameterValue(
+                "The input of subset requests run in a pool must be path(s) to files."
+            )
+
+        if request.get("output_type") == "xarray":
+            raise InvalidParameterValue(
+                "The 'xarray' output type can't be used in a pool, outputs must be written to files."
+            )
+
+        return request
+
+    def submit(self, ds, **kwargs):
+        """
+        Queue a subset request.
+
+        :param ds: path(s) to the files to subset
+        :param kwargs: other parameters of `subset`, e.g. time, area, output_dir
+        :return: result whose `get()` method waits for and returns the list of output paths
+        """
+        request = self._check_request(dict(kwargs, ds=ds))
+        return self._pool.apply_async(_run_subset, (request,))
+
+    def map(self, requests, chunksize=1):
+        """
+        Run subset requests and wait for all of them.
+
+        :param requests: dictionaries of the parameters of `subset`, including `ds`
+        :param chunksize: number of requests sent to a worker at once
+        :return: list of the output paths of each request, in the order of `requests`
+        """
+        requests = [self._check_request(dict(request)) for request in requests]
+        return self._pool.map(_run_subset, requests, chunksize=chunksize)
+
+    def close(self):
+        """Wait for the queued requests to finish and stop the workers."""
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """Stop the workers immediately, dropping the queued requests."""
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,76 @@
+import numbers
+
+import xarray as xr
+
+from clisops import logging
+from clisops.core.regrid import regrid as core_regrid
+from clisops.core.regrid import regular_grid
+from clisops.utils.file_namers import get_file_namer
+from clisops.utils.output_utils import get_chunked_input, get_split_outputs
+
+__all__ = [
+    "regrid",
+]
+
+LOGGER = logging.getLogger(__file__)
+
+
+def _get_grid(grid):
+    """
+    Return the target grid given as a Dataset or DataArray, a path to a file, or
+    the resolution in degrees of a global regular grid.
+    """
+    if isinstance(grid, numbers.Number):
+        return regular_grid(grid)
+
+    if isinstance(grid, str):
+        return xr.open_dataset(grid, use_cftime=True)
+
+    return grid
+
+
+def regrid(
+    ds,
+    grid,
+    method="conservative",
+    weights_dir=None,
+    output_dir=None,
+    output_type="netcdf",
+    split_method="time:auto",
+    file_namer="standard",
+):
+    """
+    Example:
+        ds: Xarray Dataset
+        grid: 1.0
+        method: "conservative"
+        weights_dir: "/cache/wps/weights"
+        output_dir: "/cache/wps/procs/req0111"
+        output_type: "netcdf"
+        split_method: "time:auto"
+        file_namer: "standard"
+
+    Weights are computed once per pair of grids and method, and reused from
+    memory or from `weights_dir`. They are applied lazily, chunk by chunk.
+
+    :param ds: Dataset, or path(s) to the files to open
+    :param grid: target grid, as a Dataset, a path to a file, or the resolution
+        in degrees of a global regular latitude-longitude grid
+    :param method: one of "conservative", "bilinear" or "nearest"
+    :param weights_dir: directory where weights are stored, to be shared
+        between processes
+    :param output_dir:
+    :param output_type:
+    :param split_method:
+    :param file_namer:
+    :return: list of outputs
+    """
+    request = ("regrid", ds, grid, method, output_type, split_method)
+    ds = get_chunked_input(ds)
+    grid = _get_grid(grid)
+
+    LOGGER.debug(f"Regridding with method: {method}")
+    result_ds = core_regrid(ds, grid, method=method, weights_dir=weights_dir)
+
+    namer = get_file_namer(file_namer)(request=request)
+    return get_split_outputs(result_ds, output_type, output_dir, split_method, namer)
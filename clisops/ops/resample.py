@@ -0,0 +1,128 @@
+from clisops import logging
+from clisops.core.resample import climatology as core_climatology
+from clisops.core.resample import resample as core_resample
+from clisops.ops.subset import _get_subset_args, _subset
+from clisops.utils.file_namers import get_file_namer
+from clisops.utils.output_utils import get_chunked_input, get_split_outputs
+
+__all__ = [
+    "climatology",
+    "resample",
+]
+
+LOGGER = logging.getLogger(__file__)
+
+
+def _get_input(ds, time, area, level, shape):
+    ds = get_chunked_input(ds)
+
+    if any(param is not None for param in [time, area, level, shape]):
+        args = _get_subset_args(ds, time, area, level, shape)
+        ds = _subset(ds, args)
+
+    return ds
+
+
+def resample(
+    ds,
+    freq,
+    how="mean",
+    time=None,
+    area=None,
+    level=None,
+    shape=None,
+    output_dir=None,
+    output_type="netcdf",
+    split_method="time:auto",
+    file_namer="standard",
+):
+    """
+    Example:
+        ds: Xarray Dataset
+        freq: "year"
+        how: "mean"
+        time: ("1999-01-01T00:00:00", "2100-12-30T00:00:00")
+        area: (-5.,49.,10.,65)
+        level: (1000.,)
+        shape: None
+        output_dir: "/cache/wps/procs/req0111"
+        output_type: "netcdf"
+        split_method: "time:auto"
+        file_namer: "standard"
+
+    Works on any calendar, including cftime calendars. The input is optionally
+    subset first, in the same computation, like in `average_over_dims`.
+
+    :param ds: Dataset, or path(s) to the files to open
+    :param freq: resampling frequency, one of "year", "season" or "month"
+    :param how: statistic to compute, one of "mean", "sum", "min" or "max"
+    :param time: time range to subset to before resampling
+    :param area: bounding box to subset to before resampling
+    :param level: level range to subset to before resampling
+    :param shape: path to a shape file, or a GeoDataFrame, to subset to before
+        resampling, instead of `area`
+    :param output_dir:
+    :param output_type:
+    :param split_method:
+    :param file_namer:
+    :return: list of outputs
+    """
+    request = ("resample", ds, freq, how, time, area, level, shape)
+    request += (output_type, split_method)
+    ds = _get_input(ds, time, area, level, shape)
+
+    LOGGER.debug(f"Resampling with frequency: {freq}, statistic: {how}")
+    result_ds = core_resample(ds, freq, how=how)
+
+    namer = get_file_namer(file_namer)(request=request)
+    return get_split_outputs(result_ds, output_type, output_dir, split_method, namer)
+
+
+def climatology(
+    ds,
+    freq,
+    how="mean",
+    time=None,
+    area=None,
+    level=None,
+    shape=None,
+    output_dir=None,
+    output_type="netcdf",
+    file_namer="standard",
+):
+    """
+    Example:
+        ds: Xarray Dataset
+        freq: "dayofyear"
+        how: "mean"
+        time: ("1981-01-01T00:00:00", "2010-12-30T00:00:00")
+        area: (-5.,49.,10.,65)
+        level: (1000.,)
+        shape: None
+        output_dir: "/cache/wps/procs/req0111"
+        output_type: "netcdf"
+        file_namer: "standard"
+
+    The climatology has no time dimension and is written to a single file.
+
+    :param ds: Dataset, or path(s) to the files to open
+    :param freq: climatology frequency, one of "season", "month" or "dayofyear"
+    :param how: statistic to compute, one of "mean", "sum", "min" or "max"
+    :param time: time range to subset to before computing the climatology
+    :param area: bounding box to subset to before computing the climatology
+    :param level: level range to subset to before computing the climatology
+    :param shape: path to a shape file, or a GeoDataFrame, to subset to before
+        computing the climatology, instead of `area`
+    :param output_dir:
+    :param output_type:
+    :param file_namer:
+    :return: list of outputs
+    """
+    request = ("climatology", ds, freq, how, time, area, level, shape, output_type)
+    ds = _get_input(ds, time, area, level, shape)
+
+    LOGGER.debug(f"Climatology with frequency: {freq}, statistic: {how}")
+    result_ds = core_climatology(ds, freq, how=how)
+
+    namer = get_file_namer(file_namer)(request=request)
+    return get_split_outputs(result_ds, output_type, output_dir, "time:auto", namer)
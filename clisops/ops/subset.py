@@ -6,9 +6,15 @@ from roocs_utils.parameter import parameterise
 from roocs_utils.xarray_utils import xarray_utils as xu
 
 from clisops import logging, utils
-from clisops.core import subset_bbox, subset_level, subset_time
+from clisops.core import subset_bbox, subset_level, subset_shape, subset_time
+from clisops.exceptions import InvalidParameterValue
 from clisops.utils.file_namers import get_file_namer
-from clisops.utils.output_utils import get_output, get_time_slices
+from clisops.utils.output_utils import (
+    get_format_writer,
+    get_output,
+    get_outputs,
+    get_time_slices,
+)
 
 __all__ = [
     "subset",
@@ -19,7 +25,11 @@ LOGGER = logging.getLogger(__file__)
 
 def _subset(ds, args):
 
-    if "lon_bnds" and "lat_bnds" in args:
+    if "shape" in args:
+        # subset with a shape and optionally time and level
+        LOGGER.debug(f"subset_shape with parameters: {args}")
+        result = subset_shape(ds, **args)
+    elif "lon_bnds" and "lat_bnds" in args:
         # subset with space and optionally time and level
         LOGGER.debug(f"subset_bbox with parameters: {args}")
         result = subset_bbox(ds, **args)
@@ -45,16 +55,34 @@ def _subset(ds, args):
         # subset with level only
         if any(kwargs.values()):
             LOGGER.debug(f"subset_level with parameters: {kwargs}")
-            result = subset_level(ds, **kwargs)
+            result = subset_level(result, **kwargs)
 
     return result
 
 
+def _get_subset_args(ds, time=None, area=None, level=None, shape=None):
+    LOGGER.debug(
+        f"Mapping parameters: time: {time}, area: {area}, level: {level}, shape: {shape}"
+    )
+    args = utils.map_params(ds, time, area, level)
+
+    if shape is not None:
+        if area is not None:
+            raise InvalidParameterValue(
+                "Only one of 'area' and 'shape' can be used to subset."
+            )
+        args["shape"] = shape
+
+    return args
+
+
 def subset(
     ds,
     time=None,
     area=None,
     level=None,
+    shape=None,
+    split_by_feature=False,
     output_dir=None,
     output_type="netcdf",
     split_method="time:auto",
@@ -66,6 +94,8 @@ def subset(
         time: ("1999-01-01T00:00:00", "2100-12-30T00:00:00")
         area: (-5.,49.,10.,65)
         level: (1000.,)
+        shape: "/path/to/regions.geojson"
+        split_by_feature: False
         output_dir: "/cache/wps/procs/req0111"
         output_type: "netcdf"
         split_method: "time:auto"
@@ -75,6 +105,10 @@ def subset(
     :param time:
     :param area:
     :param level:
+    :param shape: path to a shape file, or a GeoDataFrame, to subset with instead of `area`
+    :param split_by_feature: write one subset per feature of `shape`, in a sub-directory
+        of `output_dir` named after the index of the feature. All the outputs are
+        written in a single computation.
     :param output_dir:
     :param output_type:
     :param split_method:
@@ -82,26 +116,70 @@ def subset(
     :return:
     """
 
+    request = ("subset", ds, time, area, level, shape, output_type, split_method)
+    if split_by_feature:
+        request += (split_by_feature,)
+
     # Convert all inputs to Xarray Datasets
     if isinstance(ds, str):
         ds = xr.open_mfdataset(ds, use_cftime=True, combine="by_coords")
 
-    LOGGER.debug(f"Mapping parameters: time: {time}, area: {area}, level: {level}")
-    args = utils.map_params(ds, time, area, level)
+    args = _get_subset_args(ds, time, area, level, shape)
+    if split_by_feature:
+        if shape is None:
+            raise InvalidParameterValue("'split_by_feature' requires a 'shape'.")
+        args["split_by_feature"] = True
 
     subset_ds = _subset(ds, args)
 
     outputs = []
-    namer = get_file_namer(file_namer)()
+    namer = get_file_namer(file_namer)(request=request)
+
+    if split_by_feature:
+        return _get_feature_outputs(
+            subset_ds, output_type, output_dir, split_method, namer
+        )
 
     time_slices = get_time_slices(subset_ds, split_method)
 
-    for tslice in time_slices:
+    for index, tslice in enumerate(time_slices):
 
         result_ds = subset_ds.sel(time=slice(tslice[0], tslice[1]))
         LOGGER.info(f"Processing subset for times: {tslice}")
 
-        output = get_output(result_ds, output_type, output_dir, namer)
+        output = get_output(
+            result_ds, output_type, output_dir, namer, time_range=tslice, index=index
+        )
         outputs.append(output)
 
     return outputs
+
+
+def _get_feature_outputs(subsets, output_type, output_dir, split_method, namer):
+    """
+    Write the subsets of each feature, split in time, to a sub-directory of
+    `output_dir` named after the feature, in a single computation.
+    """
+    datasets, output_dirs, time_ranges, indices = [], [], [], []
+    for name, feature_ds in subsets.items():
+        feature_dir = os.path.join(output_dir or ".", str(name).replace(os.sep, "_"))
+
+        for index, tslice in enumerate(get_time_slices(feature_ds, split_method)):
+            datasets.append(feature_ds.sel(time=slice(tslice[0], tslice[1])))
+            output_dirs.append(feature_dir)
+            time_ranges.append(tslice)
+            indices.append(index)
+
+    if get_format_writer(output_type):
+        for feature_dir in set(output_dirs):
+            os.makedirs(feature_dir, exist_ok=True)
+
+    LOGGER.info(f"Processing subsets of features: {list(subsets)}")
+    return get_outputs(
+        datasets,
+        output_type,
+        output_dirs,
+        namer,
+        time_ranges=time_ranges,
+        indices=indices,
+    )
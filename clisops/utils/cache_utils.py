@@ -0,0 +1,74 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+
+class LRUCache:
+    """Small least-recently-used mapping for objects that are expensive to rebuild for a given grid.
+
+    `on_evict`, if given, is called with each value dropped from the cache, e.g. to release its resources.
+    """
+
+    def __init__(self, maxsize: int = 8, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            _, evicted = self._data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def clear(self):
+        self._data.clear()
+
+    def evict_all(self):
+        """Drop every value, least recently used first, passing each to `on_evict`."""
+        while self._data:
+            _, evicted = self._data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+
+def hash_arrays(*arrays) -> str:
+    """Return a digest identifying the shapes, dtypes and values of the given arrays."""
+    h = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.shape}{arr.dtype.str}".encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def write_atomic(path: Union[str, Path], write) -> None:
+    """Write a file with `write(f)` to a temporary file of the same directory, then move it to `path`.
+
+    Readers never see a partially written file, and concurrent writers of the same path, in other processes or
+    threads, each write their own temporary file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
@@ -1,6 +1,9 @@
 import os
+import string
 import sys
 
+import xarray as xr
+from dask.base import is_dask_collection, tokenize
 from roocs_utils.project_utils import get_project_name
 from roocs_utils.xarray_utils import xarray_utils as xu
 
@@ -9,19 +12,38 @@ from clisops.utils.output_utils import get_format_extension, get_format_writer
 
 
 def get_file_namer(name):
-    namers = {"standard": StandardFileNamer, "simple": SimpleFileNamer}
+    namers = {
+        "standard": StandardFileNamer,
+        "simple": SimpleFileNamer,
+        "deterministic": DeterministicFileNamer,
+    }
 
     return namers.get(name, StandardFileNamer)
 
 
 class _BaseFileNamer(object):
-    def __init__(self):
-        self._count = 0
+    """
+    :param request: parameters of the request the files are written for, used by
+        namers that name files from the request.
+    """
 
-    def get_file_name(self, ds, fmt=None):
+    def __init__(self, request=None):
+        self._count = 0
+        self._request = request
+
+    def get_file_name(self, ds, fmt=None, time_range=None, index=None):
+        """
+        :param ds: dataset to name
+        :param fmt: output format
+        :param time_range: (start, end) dates of the time slice of `ds`
+        :param index: position of `ds` among the outputs of the request. When
+            given, it is used instead of counting the calls to this method.
+        :return: file name
+        """
         self._count += 1
+        number = self._count if index is None else index + 1
         extension = get_format_extension(fmt)
-        return f"output_{self._count:03d}.{extension}"
+        return f"output_{number:03d}.{extension}"
 
 
 class SimpleFileNamer(_BaseFileNamer):
@@ -29,46 +51,191 @@ class SimpleFileNamer(_BaseFileNamer):
 
 
 class StandardFileNamer(SimpleFileNamer):
+    """
+    Names files from the file name template of the project of the dataset.
+
+    Templates are parsed once per project and only the attributes and derived
+    values used by the template are looked up.
+    """
+
+    # Parsed templates, by project: (template, template without time range, fields)
+    _templates = {}
+
     def _get_project(self, ds):
         try:
             return get_project_name(ds)
         except Exception:
             return None
 
-    def get_file_name(self, ds, fmt="nc"):
-        template = self._get_template(ds)
-
-        if not template:
+    def get_file_name(self, ds, fmt="nc", time_range=None, index=None):
+        """
+        :param ds: dataset to name
+        :param fmt: output format
+        :param time_range: (start, end) dates of the time slice of `ds`, as
+            returned by `get_time_slices`, to avoid reading the times of `ds`.
+        :param index: position of `ds` among the outputs of the request
+        :return: file name
+        """
+        project = self._get_project(ds)
+        compiled = self._get_compiled_template(project)
+
+        if not compiled:
             # Default to parent class namer if no method found
-            return super().get_file_name(ds)
+            return super().get_file_name(ds, index=index)
 
         self._count += 1
 
-        attr_defaults = CONFIG[f"project:{self._get_project(ds)}"]["attr_defaults"]
-        attrs = attr_defaults.copy()
-        attrs.update(ds.attrs)
-
-        self._resolve_derived_attrs(ds, attrs, template, fmt=fmt)
+        template, no_time_template, fields = compiled
+        has_time = "time" in ds.dims
+        if not has_time:
+            # e.g. averages over time
+            template = no_time_template
+
+        attr_defaults = CONFIG[f"project:{project}"]["attr_defaults"]
+        attrs = {}
+        for field in fields:
+            if field.startswith("__derive__"):
+                continue
+            attrs[field] = (
+                ds.attrs[field] if field in ds.attrs else attr_defaults[field]
+            )
+
+        self._resolve_derived_attrs(
+            ds, attrs, fields, fmt=fmt, time_range=time_range if has_time else None
+        )
         file_name = template.format(**attrs)
 
         return file_name
 
-    def _get_template(self, ds):
+    def _get_template(self, project):
         try:
-            return CONFIG[f"project:{self._get_project(ds)}"]["file_name_template"]
+            return CONFIG[f"project:{project}"]["file_name_template"]
         except Exception:
             return None
 
-    def _resolve_derived_attrs(self, ds, attrs, template, fmt=None):
-        if "__derive__var_id" in template:
+    def _get_compiled_template(self, project):
+        template = self._get_template(project)
+        if not template:
+            return None
+
+        compiled = self._templates.get(project)
+        if compiled is None or compiled[0] != template:
+            fields = {
+                field
+                for _, field, _, _ in string.Formatter().parse(template)
+                if field
+            }
+            no_time_template = template.replace("_{__derive__time_range}", "")
+            compiled = (template, no_time_template, fields)
+            self._templates[project] = compiled
+
+        return compiled
+
+    def _resolve_derived_attrs(self, ds, attrs, fields, fmt=None, time_range=None):
+        if "__derive__var_id" in fields:
             attrs["__derive__var_id"] = xu.get_main_variable(ds)
 
-        if "__derive__time_range" in template:
-            attrs["__derive__time_range"] = self._get_time_range(ds)
+        if "__derive__time_range" in fields:
+            attrs["__derive__time_range"] = (
+                _get_time_range(ds, time_range) if "time" in ds.dims else ""
+            )
 
-        if "__derive__extension" in template:
+        if "__derive__extension" in fields:
             attrs["__derive__extension"] = get_format_extension(fmt)
 
-    def _get_time_range(self, da):
-        times = da.time.values
-        return times.min().strftime("%Y%m%d") + "-" + times.max().strftime("%Y%m%d")
+
+class DeterministicFileNamer(_BaseFileNamer):
+    """
+    Names files from the request, the position of the output and its time range
+    only, e.g. "output_3f2a9c1e7b5d_001_20050101-20091230.nc".
+
+    File names don't depend on the order in which outputs are named, so that
+    outputs can be named and written by independent workers, and reruns of the
+    same request give the same paths.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self._request_hash = _tokenize_request(request)[:12]
+
+    def get_file_name(self, ds, fmt="nc", time_range=None, index=None):
+        """
+        :param ds: dataset to name
+        :param fmt: output format
+        :param time_range: (start, end) dates of the time slice of `ds`, read
+            from `ds` if not given
+        :param index: position of `ds` among the outputs of the request,
+            defaults to 0 for single outputs
+        :return: file name
+        """
+        parts = ["output", self._request_hash, f"{(index or 0) + 1:03d}"]
+        if "time" in ds.dims:
+            parts.append(_get_time_range(ds, time_range))
+
+        return "_".join(parts) + f".{get_format_extension(fmt)}"
+
+
+def _tokenize_request(request):
+    """Return a token of the parameters of a request, identifying its datasets by `_dataset_token`."""
+    if request is None:
+        return tokenize(None)
+
+    return tokenize(
+        *[
+            _dataset_token(item)
+            if isinstance(item, (xr.Dataset, xr.DataArray))
+            else item
+            for item in request
+        ]
+    )
+
+
+def _dataset_token(ds):
+    """
+    Identify a dataset from its attributes, dimensions and coordinates, and from
+    the task graphs of its lazy variables, without reading or hashing their data.
+    Variables not backed by dask are identified by the file they are read from
+    if known, and by their values otherwise.
+    """
+    if isinstance(ds, xr.DataArray):
+        ds = ds.to_dataset(name=ds.name or "__dataarray__")
+
+    source = ds.encoding.get("source")
+
+    def variable_token(var):
+        if is_dask_collection(var.data):
+            return tokenize(var.data)
+        if source is not None:
+            return (source, var.shape, var.dtype.str)
+        return tokenize(var.values)
+
+    return (
+        ds.attrs,
+        dict(ds.sizes),
+        {
+            name: (var.dims, var.attrs, variable_token(var))
+            for name, var in ds.variables.items()
+        },
+    )
+
+
+def _get_time_range(da, time_range=None):
+    if time_range is not None:
+        start, end = [_format_date(tm) for tm in time_range]
+    else:
+        # The time index is already in memory, and is usually sorted
+        times = da.indexes["time"]
+        if times.is_monotonic_increasing:
+            start, end = times[0], times[-1]
+        else:
+            start, end = times.min(), times.max()
+        start, end = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+
+    return start + "-" + end
+
+
+def _format_date(tm):
+    """Format a date string, e.g. "2005-12-16" or "2005-12-16T00:00:00", or a datetime as YYYYMMDD."""
+    if isinstance(tm, str):
+        return tm.split("T")[0].replace("-", "")
+    return tm.strftime("%Y%m%d")
@@ -0,0 +1,61 @@
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import xarray
+
+from clisops.utils.cache_utils import LRUCache, hash_arrays
+
+
+def cell_edges(
+    coord: np.ndarray, bnds: Optional[Union[xarray.DataArray, np.ndarray]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the increasing cell edges of a 1D coordinate and the cell order matching them.
+
+    Cells are assumed to be contiguous. Without bounds, edges are placed halfway between cell centers.
+    """
+    if bnds is None:
+        mid = (coord[1:] + coord[:-1]) / 2
+        if coord.size > 1:
+            lo = np.concatenate([[2 * coord[0] - mid[0]], mid])
+            hi = np.concatenate([mid, [2 * coord[-1] - mid[-1]]])
+        else:
+            lo, hi = coord - 0.5, coord + 0.5
+        bnds = np.stack([lo, hi], axis=-1)
+    bnds = np.sort(np.asarray(bnds), axis=-1)
+
+    order = np.argsort(bnds[:, 0], kind="stable")
+    edges = np.concatenate([bnds[order, 0], bnds[order[-1:], 1]])
+    return edges, order
+
+
+_spatial_index_cache = LRUCache(maxsize=8)
+
+
+def lonlat_to_xyz(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Convert longitudes and latitudes in degrees to 3D unit vectors."""
+    lon = np.deg2rad(lon)
+    lat = np.deg2rad(lat)
+    cos_lat = np.cos(lat)
+    return np.stack(
+        [cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+def get_spatial_index(lon: np.ndarray, lat: np.ndarray):
+    """Return a KD-tree over the grid points' unit vectors, cached per grid.
+
+    Chord distances between unit vectors rank points in the same order as great-circle distances, so the tree
+    can be queried with Euclidean nearest neighbours. Returns the tree and the flat grid indices of its points
+    (grid points with non-finite coordinates are left out).
+    """
+    key = hash_arrays(lon, lat)
+    index = _spatial_index_cache.get(key)
+    if index is None:
+        lon = np.ravel(lon)
+        lat = np.ravel(lat)
+        valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+        from scipy.spatial import cKDTree
+
+        index = (cKDTree(lonlat_to_xyz(lon[valid], lat[valid])), valid)
+        _spatial_index_cache.put(key, index)
+    return index
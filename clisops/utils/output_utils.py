@@ -8,7 +8,7 @@ import xarray as xr
 from roocs_utils.utils.common import parse_size
 from roocs_utils.xarray_utils import xarray_utils as xu
 
-from clisops import CONFIG, chunk_memory_limit, logging
+from clisops import CONFIG, get_chunk_memory_limit, logging
 
 LOGGER = logging.getLogger(__file__)
 
@@ -136,7 +136,7 @@ def get_time_slices(ds, split_method, start=None, end=None, file_size_limit=None
 def get_chunk_length(da):
     size = da.nbytes
     n_times = len(da.time.values)
-    mem_limit = parse_size(chunk_memory_limit)
+    mem_limit = parse_size(get_chunk_memory_limit())
 
     if size > 0:
         n_chunks = math.ceil(size / mem_limit)
@@ -148,7 +148,33 @@ def get_chunk_length(da):
     return chunk_length
 
 
+def get_chunked_input(ds):
+    """
+    Open or chunk the input of an operation so that the chunks of its variables
+    fit within the `chunk_memory_limit`, chunking along time only.
+
+    Datasets that are already dask-backed keep their chunks.
+
+    :param ds: Dataset, or path(s) to the files to open
+    :return: dask-backed Dataset
+    """
+    with dask.config.set({"array.chunk-size": get_chunk_memory_limit()}):
+        if isinstance(ds, str):
+            # Chunk while opening, so that no chunk larger than the limit is ever read
+            return xr.open_mfdataset(
+                ds, use_cftime=True, combine="by_coords", chunks={"time": "auto"}
+            )
+
+        if "time" in ds.dims and not ds.chunks:
+            return ds.chunk({"time": "auto"})
+
+    return ds
+
+
 def _get_chunked_dataset(ds):
+    if "time" not in ds.dims:
+        return ds
+
     da = get_da(ds)
     chunk_length = get_chunk_length(da)
     chunked_ds = ds.chunk({"time": chunk_length})
@@ -156,8 +182,37 @@ def _get_chunked_dataset(ds):
     return chunked_ds
 
 
-def get_output(ds, output_type, output_dir, namer):
+def _get_output_path(
+    ds, output_type, output_dir, namer, time_range=None, index=None
+):
+    file_name = namer.get_file_name(
+        ds, fmt=output_type, time_range=time_range, index=index
+    )
+
+    if not output_dir:
+        output_dir = "."
+    return os.path.join(output_dir, file_name)
+
+
+def _get_delayed_output(ds, fmt_method, output_path):
+    chunked_ds = _get_chunked_dataset(ds)
+    writer = getattr(chunked_ds, fmt_method)
+    return writer(output_path, compute=False)
+
+
+def get_output(ds, output_type, output_dir, namer, time_range=None, index=None):
+    """
+    Write `ds` in the requested format, or return it for the "xarray" output type.
 
+    :param ds: xarray Dataset
+    :param output_type: output format
+    :param output_dir: output directory
+    :param namer: file namer
+    :param time_range: (start, end) dates of the time slice of `ds`, as returned by
+        `get_time_slices`, used by the namer instead of reading the times of `ds`.
+    :param index: position of `ds` among the outputs of the request, given to the namer.
+    :return: output path, or the dataset itself for the "xarray" output type.
+    """
     fmt_method = get_format_writer(output_type)
     LOGGER.info(f"fmt_method={fmt_method}, output_type={output_type}")
 
@@ -165,21 +220,107 @@ def get_output(ds, output_type, output_dir, namer):
         LOGGER.info(f"Returning output as {type(ds)}")
         return ds
 
-    file_name = namer.get_file_name(ds, fmt=output_type)
-    chunked_ds = _get_chunked_dataset(ds)
-
-    if not output_dir:
-        output_dir = "."
-    output_path = os.path.join(output_dir, file_name)
+    output_path = _get_output_path(
+        ds, output_type, output_dir, namer, time_range, index
+    )
+    delayed_obj = _get_delayed_output(ds, fmt_method, output_path)
 
     # TODO: writing output works currently only in sync mode, see:
     #  - https://github.com/roocs/rook/issues/55
     #  - https://docs.dask.org/en/latest/scheduling.html
     with dask.config.set(scheduler="synchronous"):
-
-        writer = getattr(chunked_ds, fmt_method)
-        delayed_obj = writer(output_path, compute=False)
         delayed_obj.compute()
 
     LOGGER.info(f"Wrote output file: {output_path}")
     return output_path
+
+
+def get_outputs(
+    datasets, output_type, output_dir, namer, time_ranges=None, indices=None
+):
+    """
+    Write several datasets computed from the same inputs, e.g. the per-feature subsets of
+    `subset_shape(..., split_by_feature=True)`, in a single dask computation so that input
+    chunks shared by several outputs are only read once.
+
+    :param datasets: list of xarray Datasets
+    :param output_type: output format
+    :param output_dir: output directory, or list of the output directories of each dataset
+    :param namer: file namer, that must give a different name to each dataset
+        written to the same directory
+    :param time_ranges: list of the (start, end) dates of the time slice of each
+        dataset, given to the namer
+    :param indices: list of the positions given to the namer, defaults to the
+        positions of the datasets in `datasets`
+    :return: list of output paths, or the datasets themselves for the "xarray" output type.
+    """
+    fmt_method = get_format_writer(output_type)
+    LOGGER.info(f"fmt_method={fmt_method}, output_type={output_type}")
+
+    if not fmt_method:
+        LOGGER.info(f"Returning outputs as {[type(ds) for ds in datasets]}")
+        return list(datasets)
+
+    n = len(datasets)
+    if output_dir is None or isinstance(output_dir, (str, os.PathLike)):
+        output_dir = [output_dir] * n
+    time_ranges = time_ranges or [None] * n
+    indices = indices or range(n)
+
+    output_paths = [
+        _get_output_path(ds, output_type, out_dir, namer, time_range, index)
+        for ds, out_dir, time_range, index in zip(
+            datasets, output_dir, time_ranges, indices
+        )
+    ]
+    if len(set(output_paths)) != len(output_paths):
+        raise ValueError(
+            f"Output file names are not unique: {output_paths}. Use a namer giving a different name to each output."
+        )
+
+    delayed_objs = [
+        _get_delayed_output(ds, fmt_method, output_path)
+        for ds, output_path in zip(datasets, output_paths)
+    ]
+
+    # Same restriction as in `get_output` on the scheduler
+    with dask.config.set(scheduler="synchronous"):
+        dask.compute(*delayed_objs)
+
+    LOGGER.info(f"Wrote output files: {output_paths}")
+    return output_paths
+
+
+def get_split_outputs(ds, output_type, output_dir, split_method, namer):
+    """
+    Write the result of an operation split into time slices with `split_method`,
+    or to a single output if it has no time dimension, e.g. averages over time.
+
+    :param ds: xarray Dataset
+    :param output_type: output format
+    :param output_dir: output directory
+    :param split_method: method to split the time dimension, see `get_time_slices`
+    :param namer: file namer
+    :return: list of output paths, or of datasets for the "xarray" output type.
+    """
+    if "time" not in ds.dims:
+        return [get_output(ds, output_type, output_dir, namer)]
+
+    outputs = []
+    for index, tslice in enumerate(get_time_slices(ds, split_method)):
+
+        slice_ds = ds.sel(time=slice(tslice[0], tslice[1]))
+        LOGGER.info(f"Processing outputs for times: {tslice}")
+
+        outputs.append(
+            get_output(
+                slice_ds,
+                output_type,
+                output_dir,
+                namer,
+                time_range=tslice,
+                index=index,
+            )
+        )
+
+    return outputs
@@ -0,0 +1,95 @@
+from functools import partial
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import xarray
+from scipy import sparse
+
+# Statistics computed by `reduce_cells`
+STATISTICS = ["mean", "sum", "min", "max"]
+
+
+def mask_to_sparse(
+    mask: Union[xarray.DataArray, np.ndarray], n_regions: Optional[int] = None
+):
+    """Convert an integer label mask to a sparse matrix of the grid cells in each region.
+
+    Parameters
+    ----------
+    mask : Union[xarray.DataArray, np.ndarray]
+      Label mask, as returned by the mask creation functions with `as_labels=True`.
+    n_regions : Optional[int]
+      Number of regions. Defaults to the largest label + 1.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+      Boolean matrix of shape (n_regions, mask.size), row `i` flagging the (flattened) cells of region `i`.
+      The cells of region `i` are `m.indices[m.indptr[i]:m.indptr[i + 1]]`.
+    """
+    labels = np.ravel(np.asarray(mask))
+    cells = np.flatnonzero(labels >= 0)
+    if n_regions is None:
+        n_regions = int(labels.max()) + 1 if cells.size else 0
+    return sparse.csr_matrix(
+        (np.ones(cells.size, dtype=bool), (labels[cells], cells)),
+        shape=(n_regions, labels.size),
+    )
+
+
+def aggregate_cells(
+    da: xarray.DataArray, spatial_dims: Sequence[str], cells: sparse.csr_matrix, how
+) -> xarray.DataArray:
+    """Reduce the spatial dimensions of a DataArray to the regions given by the rows of `cells`."""
+    other_dims = [d for d in da.dims if d not in spatial_dims]
+    da = da.transpose(*other_dims, *spatial_dims)
+    data = da.data
+    shape = data.shape[: len(other_dims)] + (cells.shape[1],)
+    reduce = partial(reduce_cells, cells=cells, how=how)
+
+    if da.chunks is not None:
+        data = data.rechunk({i: -1 for i in range(len(other_dims), data.ndim)})
+        data = data.reshape(shape)
+        out = data.map_blocks(
+            reduce,
+            chunks=data.chunks[:-1] + ((cells.shape[0],),),
+            dtype=float,
+        )
+    else:
+        out = reduce(np.reshape(data, shape))
+
+    return xarray.DataArray(
+        out,
+        dims=other_dims + ["_region"],
+        coords={k: v for k, v in da.coords.items() if set(v.dims).issubset(other_dims)},
+        name=da.name,
+        attrs=da.attrs,
+    )
+
+
+def reduce_cells(values: np.ndarray, cells: sparse.csr_matrix, how: str):
+    """Reduce the last axis of `values` to the rows of the (rows, cells) sparse matrix, skipping NaNs.
+
+    Sums and means use the matrix values as weights, minimums and maximums are taken over the non-zero cells.
+    """
+    n = values.shape[-1]
+    x = np.reshape(values, (-1, n)).astype(float)
+
+    if how in ["sum", "mean"]:
+        notnull = ~np.isnan(x)
+        total = (cells @ np.where(notnull, x, 0).T).T
+        if how == "sum":
+            out = total
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = total / (cells @ notnull.T.astype(float)).T
+    else:
+        reduce = np.fmin if how == "min" else np.fmax
+        out = np.full((x.shape[0], cells.shape[0]), np.nan)
+        nonempty = np.diff(cells.indptr) > 0
+        if nonempty.any():
+            out[:, nonempty] = reduce.reduceat(
+                x[:, cells.indices], cells.indptr[:-1][nonempty], axis=1
+            )
+
+    return np.reshape(out, values.shape[:-1] + (cells.shape[0],))
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from clisops.core import average
+from clisops.core.average import average_over_dims
+
+
+@pytest.fixture
+def ds():
+    time = pd.date_range("2000-01-01", periods=6, freq="MS")
+    lat = xr.DataArray(
+        [-45.0, 0.0, 45.0],
+        dims=("lat",),
+        attrs={"standard_name": "latitude", "bounds": "lat_bnds"},
+    )
+    lon = xr.DataArray(
+        [0.0, 90.0, 180.0, 270.0], dims=("lon",), attrs={"standard_name": "longitude"}
+    )
+    data = np.random.RandomState(1).rand(time.size, lat.size, lon.size)
+    data[0, 0, 0] = np.nan
+    return xr.Dataset(
+        {
+            "tas": (("time", "lat", "lon"), data, {"units": "K"}),
+            "lat_bnds": (("lat", "bnds"), [[-90, -22.5], [-22.5, 22.5], [22.5, 90]]),
+            "time_bnds": (("time", "bnds"), np.stack([time, time], axis=-1)),
+        },
+        coords={"time": time, "lat": lat, "lon": lon},
+        attrs={"title": "test"},
+    )
+
+
+class TestAverageOverDims:
+    def test_time(self, ds):
+        out = average_over_dims(ds, dims=["time"])
+        assert out.tas.dims == ("lat", "lon")
+        np.testing.assert_allclose(out.tas, np.nanmean(ds.tas, axis=0))
+        assert out.tas.attrs == ds.tas.attrs
+        assert out.attrs == ds.attrs
+        assert "time_bnds" not in out
+        assert "lat_bnds" in out
+
+    def test_lat_lon(self, ds):
+        out = average_over_dims(ds, dims=["latitude", "longitude"])
+        assert out.tas.dims == ("time",)
+        assert out.tas.dtype == ds.tas.dtype
+        assert out.tas.attrs == ds.tas.attrs
+        assert "lat_bnds" not in out
+        assert "time_bnds" in out
+
+        # Weights from the bounds: sin(lat1) - sin(lat0)
+        s = np.sin(np.deg2rad(22.5))
+        weights = xr.DataArray([1 - s, 2 * s, 1 - s], dims=("lat",))
+        expected = ds.tas.weighted(weights).mean(dim=["lat", "lon"])
+        np.testing.assert_allclose(out.tas, expected)
+
+    def test_cos_lat(self, ds):
+        out = average_over_dims(ds.drop_vars("lat_bnds"), dims=["latitude"])
+        weights = np.cos(np.deg2rad(ds.lat))
+        np.testing.assert_allclose(out.tas, ds.tas.weighted(weights).mean(dim="lat"))
+
+    def test_areacella(self, ds):
+        areacella = xr.DataArray(
+            np.arange(1.0, 13).reshape(3, 4),
+            dims=("lat", "lon"),
+            coords={"lat": ds.lat + 1e-9, "lon": ds.lon},
+        )
+        expected = ds.tas.weighted(areacella.drop_vars("lat")).mean(dim=["lat", "lon"])
+
+        out = average_over_dims(ds, dims=["latitude", "longitude"], areacella=areacella)
+        np.testing.assert_allclose(out.tas, expected)
+
+        out = average_over_dims(
+            ds.assign(areacella=areacella.drop_vars("lat")),
+            dims=["latitude", "longitude"],
+        )
+        np.testing.assert_allclose(out.tas, expected)
+        assert "areacella" not in out
+
+    def test_unweighted(self, ds):
+        out = average_over_dims(ds, dims=["latitude"], area_weighted=False)
+        xr.testing.assert_identical(out.tas, ds.tas.mean(dim="lat", keep_attrs=True))
+
+    def test_weights_cache(self, ds):
+        average._area_weights_cache.clear()
+        average_over_dims(ds, dims=["latitude"])
+        average_over_dims(ds.chunk({"time": 2}), dims=["latitude", "time"])
+        assert len(average._area_weights_cache._data) == 1
+
+    def test_dask(self, ds):
+        out = average_over_dims(ds.chunk({"time": 2}), dims=["time"])
+        assert out.tas.chunks is not None
+        xr.testing.assert_allclose(out.tas, average_over_dims(ds, dims=["time"]).tas)
+
+    def test_dataarray(self, ds):
+        out = average_over_dims(ds.tas, dims=["longitude"])
+        assert out.dims == ("time", "lat")
+
+    def test_undetected(self, ds):
+        with pytest.raises(ValueError, match="level"):
+            average_over_dims(ds, dims=["time", "level"])
+
+        out = average_over_dims(ds, dims=["time", "level"], ignore_undetected_dims=True)
+        assert "time" not in out.dims
+
+    @pytest.mark.parametrize("dims", [None, [], ["height"]])
+    def test_raise(self, ds, dims):
+        with pytest.raises(ValueError):
+            average_over_dims(ds, dims=dims)
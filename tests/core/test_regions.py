@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from clisops.core.regions import aggregate_regions
+from clisops.core.subset import mask_to_sparse
+
+
+@pytest.fixture
+def tas():
+    time = pd.date_range("2000-01-01", periods=10, freq="D")
+    lon = np.arange(0.5, 6)
+    lat = np.arange(0.5, 4)
+    data = np.random.RandomState(0).rand(time.size, lat.size, lon.size)
+    data[0, 0, 0] = np.nan
+    return xr.DataArray(
+        data,
+        dims=("time", "lat", "lon"),
+        coords={"time": time, "lat": lat, "lon": lon},
+        name="tas",
+        attrs={"units": "K"},
+    )
+
+
+@pytest.fixture
+def labels(tas):
+    values = np.full((tas.lon.size, tas.lat.size), -1, dtype=np.int8)
+    values[:3, :2] = 0
+    values[3:, :] = 1
+    values[0, 3] = 2
+    return xr.DataArray(
+        values, dims=("lon", "lat"), coords={"lon": tas.lon, "lat": tas.lat}
+    )
+
+
+def _expected(tas, labels, how):
+    return np.stack(
+        [getattr(tas.where(labels == i), how)(dim=["lat", "lon"]) for i in range(3)],
+        axis=-1,
+    )
+
+
+class TestAggregateRegions:
+    @pytest.mark.parametrize("how", ["mean", "sum", "min", "max"])
+    def test_statistics(self, tas, labels, how):
+        out = aggregate_regions(tas, labels, how=how)
+        assert out.dims == ("time", "regions")
+        assert out.attrs == tas.attrs
+        np.testing.assert_allclose(out, _expected(tas, labels, how))
+
+    def test_dask(self, tas, labels):
+        out = aggregate_regions(tas.chunk({"time": 3, "lon": 2}), labels)
+        assert out.chunks == ((3, 3, 3, 1), (3,))
+        np.testing.assert_allclose(out.compute(), aggregate_regions(tas, labels))
+
+    def test_dataset(self, tas, labels):
+        ds = xr.Dataset({"tas": tas, "time_bnds": tas.time.expand_dims(bnds=2)})
+        out = aggregate_regions(ds, labels, regions=["a", "b", "c"])
+        assert set(out.data_vars) == {"tas"}
+        assert list(out.regions.values) == ["a", "b", "c"]
+
+    def test_weights(self, tas, labels):
+        weights = np.cos(np.deg2rad(tas.lat)) * xr.ones_like(tas.lon)
+        out = aggregate_regions(tas, labels, weights=weights)
+
+        expected = tas.where(labels == 1).weighted(weights).mean(dim=["lon", "lat"])
+        np.testing.assert_allclose(out.sel(regions=1), expected)
+
+    def test_coverage(self, tas, labels):
+        frac = xr.concat(
+            [(labels == i).astype(float) for i in range(3)], dim="regions"
+        ).assign_coords(regions=["a", "b", "c"])
+        frac[0] *= 0.5
+
+        out = aggregate_regions(tas, frac)
+        np.testing.assert_allclose(out, aggregate_regions(tas, labels))
+        assert list(out.regions.values) == ["a", "b", "c"]
+
+    def test_sparse_coverage(self, tas, labels):
+        frac = mask_to_sparse(labels.values, n_regions=3).astype(float)
+        frac[0] *= 0.5
+
+        out = aggregate_regions(
+            tas, frac, spatial_dims=["lon", "lat"], regions=["a", "b", "c"]
+        )
+        np.testing.assert_allclose(out, aggregate_regions(tas, labels))
+        assert list(out.regions.values) == ["a", "b", "c"]
+
+        with pytest.raises(ValueError):
+            aggregate_regions(tas, frac)
+
+    def test_raise(self, tas, labels):
+        with pytest.raises(ValueError):
+            aggregate_regions(tas, labels, how="median")
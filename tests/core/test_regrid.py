@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from clisops.core.regrid import _weights_cache, regrid, regrid_weights, regular_grid
+
+
+def _field(lat, lon):
+    return np.cos(np.deg2rad(lat)) * np.sin(np.deg2rad(lon)) + 2
+
+
+@pytest.fixture
+def ds():
+    """2 degree global grid, with longitudes from 0 to 360."""
+    ds = regular_grid(2.0)
+    ds = ds.roll(lon=90, roll_coords=True)
+    ds = ds.assign_coords(lon=ds.lon.values % 360)
+    ds.lon.attrs.update(standard_name="longitude", bounds="lon_bnds")
+    ds["lon_bnds"] = ds.lon + xr.DataArray([-1.0, 1.0], dims=("bnds",))
+    lat, lon = np.meshgrid(ds.lat, ds.lon, indexing="ij")
+    data = np.stack([_field(lat, lon), 2 * _field(lat, lon)]).astype(np.float32)
+    data[0, 10, 10] = np.nan
+    return ds.assign(tas=(("time", "lat", "lon"), data, {"units": "K"}))
+
+
+def _cell_areas(grid):
+    lat = np.abs(np.diff(np.sin(np.deg2rad(grid.lat_bnds.values)), axis=1))
+    lon = np.abs(np.diff(grid.lon_bnds.values, axis=1))
+    return lat * lon.T
+
+
+class TestRegrid:
+    @pytest.mark.parametrize(
+        "method,tolerance",
+        [("conservative", 0.02), ("bilinear", 1e-3), ("nearest", 0.02)],
+    )
+    def test_methods(self, ds, method, tolerance):
+        grid = regular_grid(3.0)
+        out = regrid(ds.chunk({"time": 1}), grid, method=method)
+
+        assert out.tas.dims == ("time", "lat", "lon")
+        assert out.tas.dtype == ds.tas.dtype
+        assert out.tas.attrs == ds.tas.attrs
+        assert out.tas.chunks is not None
+        np.testing.assert_array_equal(out.lat, grid.lat)
+        xr.testing.assert_identical(out.lon_bnds, grid.lon_bnds)
+
+        lat, lon = np.meshgrid(grid.lat, grid.lon, indexing="ij")
+        np.testing.assert_allclose(out.tas[1] / 2, _field(lat, lon), atol=tolerance)
+        # Missing values are skipped
+        assert not np.isnan(out.tas[0]).any()
+
+    def test_conservative(self, ds):
+        grid = regular_grid(3.0)
+        out = regrid(ds, grid)
+        np.testing.assert_allclose(
+            (out.tas[1] * _cell_areas(grid)).sum() / _cell_areas(grid).sum(),
+            (ds.tas[1] * _cell_areas(ds)).sum() / _cell_areas(ds).sum(),
+        )
+
+    def test_regional_bilinear(self, ds):
+        grid = regular_grid(3.0).isel(lon=slice(0, 60))
+        src = ds.sel(lon=slice(100, 200))
+        out = regrid(src.tas, grid, method="bilinear")
+        inside = (grid.lon % 360 >= 101) & (grid.lon % 360 <= 199)
+        assert not np.isnan(out[1].where(inside, 0)).any()
+        assert np.isnan(out[1].where(~inside)).all()
+
+    def test_curvilinear(self, ds):
+        lat, lon = np.meshgrid(
+            np.arange(-60.0, 61, 5), np.arange(0.0, 90, 5), indexing="ij"
+        )
+        grid = xr.Dataset(
+            coords={
+                "lat": (("y", "x"), lat + lon / 100),
+                "lon": (("y", "x"), lon - 180),
+            }
+        )
+        grid.lat.attrs["standard_name"] = "latitude"
+        grid.lon.attrs["standard_name"] = "longitude"
+
+        out = regrid(ds.tas, grid, method="nearest")
+        assert out.dims == ("time", "y", "x")
+        np.testing.assert_allclose(out[1] / 2, _field(grid.lat, grid.lon), atol=0.05)
+
+        with pytest.raises(ValueError):
+            regrid(ds, grid, method="bilinear")
+
+    def test_weights_cache(self, ds, tmpdir):
+        grid = regular_grid(3.0)
+        _weights_cache.clear()
+        weights = regrid_weights(ds, grid, method="bilinear", weights_dir=tmpdir)
+        assert weights.shape == (60 * 120, 90 * 180)
+        assert len(tmpdir.listdir()) == 1
+
+        assert regrid_weights(ds.isel(time=0), grid, method="bilinear") is weights
+
+        _weights_cache.clear()
+        stored = regrid_weights(ds, grid, method="bilinear", weights_dir=tmpdir)
+        assert (stored != weights).nnz == 0
+
+    def test_raise(self, ds):
+        with pytest.raises(ValueError):
+            regrid(ds, regular_grid(3.0), method="patch")
+        with pytest.raises(ValueError):
+            regular_grid(7.0)
+
+
+class TestNearest:
+    def test_index_map(self, ds):
+        grid = regular_grid(3.0)
+        weights = regrid_weights(ds, grid, method="nearest")
+        assert np.all(np.diff(weights.indptr) == 1)
+
+        out = regrid(ds.tas.chunk({"time": 1}), grid, method="nearest")
+        expected = ds.tas.values.reshape(2, -1)[:, weights.indices]
+        np.testing.assert_array_equal(out.values.reshape(2, -1), expected)
+
+    def test_dtype(self, ds):
+        counts = ds.tas.fillna(0).astype(np.int16)
+        out = regrid(counts, regular_grid(3.0), method="nearest")
+        assert out.dtype == np.int16
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from clisops.core.resample import _group_chunks, climatology, resample
+
+
+@pytest.fixture(params=["standard", "noleap", "360_day"])
+def ds(request):
+    time = xr.cftime_range(
+        "2000-01-01", periods=800, freq="D", calendar=request.param
+    )
+    data = np.random.RandomState(0).rand(time.size, 2, 3)
+    data[5, 0, 0] = np.nan
+    ds = xr.Dataset(
+        {
+            "tas": (("time", "lat", "lon"), data, {"units": "K"}),
+            "time_bnds": (("time", "bnds"), np.zeros((time.size, 2))),
+        },
+        coords={"time": time, "lat": [1.0, 2.0], "lon": [1.0, 2.0, 3.0]},
+    )
+    ds.time.attrs.update(standard_name="time", bounds="time_bnds")
+    return ds
+
+
+class TestResample:
+    @pytest.mark.parametrize("how", ["mean", "sum", "min", "max"])
+    @pytest.mark.parametrize("freq,rule", [("year", "AS"), ("month", "MS")])
+    def test_statistics(self, ds, freq, rule, how):
+        expected = getattr(ds.tas.resample(time=rule), how)()
+
+        out = resample(ds, freq, how=how)
+        assert out.tas.dims == ("time", "lat", "lon")
+        assert out.tas.attrs == ds.tas.attrs
+        assert "time_bnds" not in out
+        np.testing.assert_array_equal(out.time, expected.time)
+        np.testing.assert_allclose(out.tas, expected)
+
+        out = resample(ds.chunk({"time": 100}), freq, how=how)
+        assert out.tas.chunks is not None
+        np.testing.assert_allclose(out.tas, expected)
+
+    def test_season(self, ds):
+        out = resample(ds.tas, "season")
+        expected = ds.tas.resample(time="QS-DEC").mean()
+        # The first December-February season starts in January
+        assert out.time[0] == ds.time[0]
+        np.testing.assert_allclose(out[1:], expected[1:])
+
+    def test_chunks(self, ds):
+        out = resample(ds.tas.chunk({"time": 100}), "year")
+        # Time chunks are moved to the start of the years and reduced to their own years only
+        assert out.chunks == ((1, 2), (2,), (3,))
+        np.testing.assert_allclose(out, resample(ds.tas, "year"))
+
+        out = resample(ds.tas.chunk({"time": 100}), "month")
+        assert sum(out.chunks[0]) == out.time.size
+        assert max(out.chunks[0]) <= 5
+
+    def test_group_chunks(self):
+        codes = np.repeat([0, 1, 2, 3], [3, 5, 2, 4])
+        assert _group_chunks(codes, (4, 4, 4, 2)) == (3, 5, 2, 4)
+        assert _group_chunks(codes, (14,)) == (14,)
+        # Groups longer than a chunk are kept whole
+        assert _group_chunks(np.repeat([0, 1], [10, 2]), (4, 4, 4)) == (12,)
+
+    def test_raise(self, ds):
+        with pytest.raises(ValueError):
+            resample(ds, "week")
+        with pytest.raises(ValueError):
+            resample(ds, "year", how="median")
+
+
+class TestClimatology:
+    @pytest.mark.parametrize("how", ["mean", "max"])
+    @pytest.mark.parametrize("freq", ["season", "month", "dayofyear"])
+    def test_statistics(self, ds, freq, how):
+        out = climatology(ds.chunk({"time": 77}), freq, how=how)
+        expected = getattr(ds.tas.groupby(f"time.{freq}"), how)()
+
+        assert out.tas.dims == (freq, "lat", "lon")
+        np.testing.assert_allclose(out.tas, expected.sel({freq: out[freq].values}))
+
+    def test_chunks(self, ds):
+        out = climatology(ds.tas.chunk({"time": 77}), "dayofyear")
+        # Days of the year, found at least twice, are gathered by chunks of about 77 time steps
+        assert sum(out.chunks[0]) == out.dayofyear.size
+        assert len(out.chunks[0]) > 1 and max(out.chunks[0]) <= 40
+
+    def test_groups(self, ds):
+        assert list(climatology(ds, "season").season.values) == [
+            "DJF",
+            "MAM",
+            "JJA",
+            "SON",
+        ]
+        assert climatology(ds, "dayofyear").dayofyear.size == len(
+            np.unique(ds.time.dt.dayofyear)
+        )
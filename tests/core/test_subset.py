@@ -4,8 +4,11 @@ import geopandas as gpd
 import numpy as np
 import pytest
 import xarray as xr
+from scipy import sparse
+from shapely.geometry import Polygon, box
 
 from clisops.core import subset
+from clisops.utils import grid_utils
 
 from .._common import XCLIM_TESTS_DATA as TESTS_DATA
 
@@ -271,6 +274,50 @@ class TestSubsetGridPoint:
         np.testing.assert_almost_equal(gp.lat, lat)
         assert gp.site == 0
 
+    def test_irregular_nearest_matches_distance(self):
+        da = xr.open_dataset(self.nc_2dlonlat).tasmax
+        lon = [-72.4, -67.1, -70.0]
+        lat = [46.1, 48.2, 47.3]
+        out = subset.subset_gridpoint(da, lon=lon, lat=lat, add_distance=True)
+
+        d = subset.distance(da, lon=lon, lat=lat)
+        for i in range(len(lon)):
+            np.testing.assert_allclose(out.distance[i], d.isel(site=i).min())
+
+    def test_irregular_many_sites_dask(self):
+        da = xr.open_dataset(self.nc_2dlonlat).tasmax.chunk({"time": 5})
+        lon = np.linspace(-72.4, -67.1, 50)
+        lat = np.linspace(46.1, 48.2, 50)
+
+        out = subset.subset_gridpoint(da, lon=lon, lat=lat)
+        assert out.site.size == 50
+        # Sites come from a single pointwise selection, not one chunk per site
+        assert out.chunks[out.get_axis_num("site")] == (50,)
+
+        expected = subset.subset_gridpoint(da.load(), lon=lon[:2], lat=lat[:2])
+        np.testing.assert_array_equal(out.isel(site=slice(0, 2)), expected)
+
+    def test_spatial_index_cache(self):
+        da = xr.open_dataset(self.nc_2dlonlat).tasmax
+        grid_utils._spatial_index_cache.clear()
+
+        subset.subset_gridpoint(da, lon=-72.4, lat=46.1)
+        tree, _ = grid_utils.get_spatial_index(da.lon.values, da.lat.values)
+
+        subset.subset_gridpoint(da, lon=-67.1, lat=48.2)
+        assert grid_utils.get_spatial_index(da.lon.values, da.lat.values)[0] is tree
+
+    def test_haversine(self):
+        da = xr.open_dataset(self.nc_2dlonlat).tasmax
+        lon = [-72.4, -67.1]
+        lat = [46.1, 48.2]
+        out = subset.subset_gridpoint(
+            da, lon=lon, lat=lat, method="haversine", add_distance=True
+        )
+        expected = subset.subset_gridpoint(da, lon=lon, lat=lat, add_distance=True)
+        np.testing.assert_array_equal(out, expected)
+        np.testing.assert_allclose(out.distance, expected.distance, rtol=1e-2)
+
     def test_positive_lons(self):
         da = xr.open_dataset(self.nc_poslons).tas
         lon = -72.4
@@ -779,6 +826,233 @@ class TestSubsetShape:
         assert all(vals == [0, 1, 2])
         assert all(counts == [58, 250, 22])
 
+    def test_mask_vectorize_multiregions(self):
+        ds = xr.open_dataset(self.nc_file)
+        regions = gpd.read_file(self.multi_regions_geojson)
+        mask = subset.create_mask_vectorize(
+            x_dim=ds.lon, y_dim=ds.lat, poly=regions, wrap_lons=True
+        )
+        vals, counts = np.unique(mask.values[mask.notnull()], return_counts=True)
+        assert all(vals == [0, 1, 2])
+        assert all(counts == [58, 250, 22])
+
+    def test_mask_vectorize_2d(self):
+        ds = xr.open_dataset(self.lons_2d_nc_file)
+        poly = gpd.read_file(self.eastern_canada_geojson)
+        mask = subset.create_mask_vectorize(x_dim=ds.lon, y_dim=ds.lat, poly=poly)
+        expected = subset.create_mask(x_dim=ds.lon, y_dim=ds.lat, poly=poly)
+        assert mask.dims == ds.lon.dims
+        np.testing.assert_array_equal(mask, expected)
+
+    @pytest.mark.parametrize(
+        "create",
+        [
+            subset.create_mask,
+            subset.create_mask_vectorize,
+            subset.create_mask_rasterize,
+        ],
+    )
+    def test_mask_labels(self, create):
+        ds = xr.open_dataset(self.nc_file)
+        regions = gpd.read_file(self.multi_regions_geojson)
+        labels = create(
+            x_dim=ds.lon, y_dim=ds.lat, poly=regions, wrap_lons=True, as_labels=True
+        )
+        assert labels.dtype == np.int8
+
+        mask = create(x_dim=ds.lon, y_dim=ds.lat, poly=regions, wrap_lons=True)
+        np.testing.assert_array_equal(labels.where(labels >= 0), mask)
+
+        cells = subset.mask_to_sparse(labels)
+        assert cells.shape == (3, labels.size)
+        np.testing.assert_array_equal(cells.getnnz(axis=1), [58, 250, 22])
+        np.testing.assert_array_equal(
+            labels.values.ravel()[cells.indices[cells.indptr[1] : cells.indptr[2]]], 1
+        )
+
+    def test_mask_rasterize(self):
+        ds = xr.open_dataset(self.nc_file)
+        regions = gpd.read_file(self.multi_regions_geojson)
+        mask = subset.create_mask_rasterize(
+            x_dim=ds.lon, y_dim=ds.lat, poly=regions, wrap_lons=True
+        )
+        expected = subset.create_mask(
+            x_dim=ds.lon, y_dim=ds.lat, poly=regions, wrap_lons=True
+        )
+        assert mask.dims == expected.dims
+        np.testing.assert_array_equal(mask, expected)
+
+        with pytest.raises(ValueError):
+            subset.create_mask_rasterize(
+                x_dim=ds.lon.expand_dims(y=ds.lat.values),
+                y_dim=ds.lat.expand_dims(x=ds.lon.values),
+                poly=regions,
+            )
+
+    def test_split_at_greenwich(self):
+        poly = gpd.GeoDataFrame(
+            geometry=[box(-10.5, -5, 10.5, 5), box(-31, -5, -19, 5)], crs=4326
+        )
+        original = poly.geometry.copy()
+        x = xr.DataArray(np.arange(0, 360, 5.0), dims=("lon",))
+        y = xr.DataArray(np.arange(-10, 11, 5.0), dims=("lat",))
+
+        with pytest.warns(UserWarning, match="Greenwich") as record:
+            mask = subset.create_mask_vectorize(
+                x_dim=x, y_dim=y, poly=poly, wrap_lons=True, as_labels=True
+            )
+        # The CRS of the split features is set without overriding it in place
+        assert not [w for w in record if "crs" in str(w.message).lower()]
+
+        # Grid points on the meridian belong to the split polygon
+        sel = mask.sel(lat=0)
+        np.testing.assert_array_equal(
+            sel.lon[sel.values == 0], [0, 5, 10, 350, 355]
+        )
+        np.testing.assert_array_equal(sel.lon[sel.values == 1], [330, 335, 340])
+        # The input is left untouched
+        assert poly.geometry.geom_equals(original).all()
+
+    @pytest.mark.parametrize("start,stop", [(-200, 200), (-10, 370)])
+    def test_wrap_lons_out_of_range(self, start, stop):
+        poly = gpd.GeoDataFrame(geometry=[box(10, -5, 20, 5)], crs=4326)
+        x = xr.DataArray(np.arange(start, stop, 5.0), dims=("lon",))
+        y = xr.DataArray(np.arange(-10, 11, 5.0), dims=("lat",))
+
+        with pytest.warns(UserWarning, match="Tread with caution"):
+            subset.create_mask_vectorize(x_dim=x, y_dim=y, poly=poly, wrap_lons=True)
+
+    def test_mask_rasterize_holes(self):
+        # Square with a square hole, and a second polygon partly covered by the first one
+        outer = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])
+        hole = [(4, 4), (6, 4), (6, 6), (4, 6)]
+        poly = gpd.GeoDataFrame(
+            geometry=[
+                Polygon(outer.exterior.coords, [hole]),
+                Polygon([(8.2, 8.2), (12.2, 8.2), (12.2, 12.2), (8.2, 12.2)]),
+            ],
+            index=[3, 7],
+        )
+        x = xr.DataArray(np.arange(-0.5, 13), dims=("lon",))
+        y = xr.DataArray(np.arange(-0.5, 13)[::-1], dims=("lat",))
+
+        mask = subset.create_mask_rasterize(x_dim=x, y_dim=y, poly=poly)
+        # Both backends give the overlap to the last geometry
+        expected = subset.create_mask_vectorize(x_dim=x, y_dim=y, poly=poly)
+        np.testing.assert_array_equal(mask, expected)
+        assert mask.sel(lon=5.5, lat=5.5).isnull()
+        assert mask.sel(lon=9.5, lat=9.5) == 7
+        assert mask.sel(lon=7.5, lat=7.5) == 3
+        assert mask.sel(lon=11.5, lat=11.5) == 7
+
+    def test_subset_rasterize(self):
+        ds = xr.open_dataset(self.nc_file)
+        sub = subset.subset_shape(ds, self.poslons_geojson, rasterize=True)
+        expected = subset.subset_shape(ds, self.poslons_geojson)
+        xr.testing.assert_identical(sub, expected)
+
+    def test_coverage_mask(self):
+        x = xr.DataArray(np.arange(0.5, 10), dims=("lon",))
+        y = xr.DataArray(np.arange(0.5, 10), dims=("lat",))
+        poly = gpd.GeoDataFrame(
+            geometry=[
+                box(2.25, 3.0, 4.75, 5.5),
+                Polygon([(1.2, 1.3), (8.7, 2.1), (4.4, 9.6)]),
+                box(6.1, 6.1, 6.2, 6.3),
+            ],
+            index=["box", "triangle", "small"],
+        )
+        frac = subset.create_coverage_mask(x_dim=x, y_dim=y, poly=poly)
+        assert sparse.issparse(frac)
+        assert frac.shape == (3, 100)
+        # Only the covered cells are stored
+        assert frac.nnz == (frac.toarray() > 0).sum()
+        dense = frac.toarray().reshape(3, 10, 10)
+
+        expected = np.zeros((10, 10))
+        expected[2:5, 3:6] = 1
+        expected[[2, 4], 3:6] *= 0.75
+        expected[2:5, 5] *= 0.5
+        np.testing.assert_allclose(dense[0], expected)
+
+        # Cells have a unit area, fractions should add up to the geometry areas.
+        np.testing.assert_allclose(np.asarray(frac.sum(axis=1)).ravel(), poly.area)
+        assert dense[2].max() > 0
+
+        # Same result with explicit cell bounds and descending coordinates
+        y_desc = y[::-1]
+        y_bnds = np.stack([y_desc - 0.5, y_desc + 0.5], axis=-1)
+        frac_desc = subset.create_coverage_mask(
+            x_dim=x, y_dim=y_desc, y_bnds=y_bnds, poly=poly
+        )
+        np.testing.assert_allclose(
+            frac_desc.toarray().reshape(3, 10, 10)[:, :, ::-1], dense
+        )
+
+    def test_coverage_mask_curvilinear(self):
+        x = xr.DataArray(np.arange(0.5, 10), dims=("lon",))
+        y = xr.DataArray(np.arange(0.5, 10), dims=("lat",))
+        poly = gpd.GeoDataFrame(
+            geometry=[Polygon([(1.2, 1.3), (8.7, 2.1), (4.4, 9.6)])]
+        )
+        expected = subset.create_coverage_mask(x_dim=x, y_dim=y, poly=poly)
+
+        lon, lat = xr.broadcast(x, y)
+        lon = lon.rename(lon="x", lat="y")
+        lat = lat.rename(lon="x", lat="y")
+        offsets = np.array([-0.5, 0.5, 0.5, -0.5])
+        frac = subset.create_coverage_mask(
+            x_dim=lon,
+            y_dim=lat,
+            x_bnds=lon.values[..., np.newaxis] + offsets,
+            y_bnds=lat.values[..., np.newaxis] + np.roll(offsets, 1),
+            poly=poly,
+        )
+        np.testing.assert_allclose(frac.toarray(), expected.toarray())
+
+        with pytest.raises(ValueError):
+            subset.create_coverage_mask(x_dim=lon, y_dim=lat, poly=poly)
+
+    def test_mask_cache(self, tmp_path, monkeypatch):
+        ds = xr.open_dataset(self.nc_file)
+        subset._mask_cache.clear()
+        sub = subset.subset_shape(ds, self.poslons_geojson, mask_cache_dir=tmp_path)
+        assert len(list(tmp_path.glob("*.npz"))) == 1
+
+        def create_mask_vectorize(**kwargs):
+            raise AssertionError("The mask should have been found in the cache.")
+
+        monkeypatch.setattr(subset, "create_mask_vectorize", create_mask_vectorize)
+
+        # From the in-memory cache
+        xr.testing.assert_identical(
+            sub, subset.subset_shape(ds, self.poslons_geojson)
+        )
+
+        # From the on-disk cache
+        subset._mask_cache.clear()
+        xr.testing.assert_identical(
+            sub,
+            subset.subset_shape(ds, self.poslons_geojson, mask_cache_dir=tmp_path),
+        )
+
+        # A different buffer needs a new mask
+        with pytest.raises(AssertionError):
+            subset.subset_shape(ds, self.poslons_geojson, buffer=0.1)
+
+    def test_mask_cache_key_crs(self):
+        x = xr.DataArray(np.arange(0, 20.0), dims=("lon",))
+        y = xr.DataArray(np.arange(0, 10.0), dims=("lat",))
+        geometry = [box(2, 2, 8, 8)]
+
+        keys = [
+            subset._mask_cache_key(x, y, gpd.GeoDataFrame(geometry=geometry, crs=crs))
+            for crs in [4326, 3857, None, 4326]
+        ]
+        # Same geometries in different CRS get different masks
+        assert len(set(keys[:3])) == 3
+        assert keys[0] == keys[3]
+
     def test_subset_multiregions(self):
         ds = xr.open_dataset(self.nc_file)
         regions = gpd.read_file(self.multi_regions_geojson)
@@ -786,6 +1060,165 @@ class TestSubsetShape:
         ds_sub = subset.subset_shape(ds, shape=regions)
         assert ds_sub.notnull().sum() == 58 + 250 + 22
 
+    def test_read_shape(self):
+        regions = gpd.read_file(self.multi_regions_geojson)
+        xmin, ymin, xmax, ymax = regions.geometry.iloc[0].bounds
+        subset._shape_cache.clear()
+
+        poly = subset._read_shape(
+            self.multi_regions_geojson, bbox=(xmin, ymin, xmax, ymax)
+        )
+        assert len(poly) >= 1
+        assert poly.envelope.intersects(box(xmin, ymin, xmax, ymax)).all()
+        assert len(subset._shape_cache._data) == 1
+
+        # Cached copies are returned
+        poly.geometry = poly.buffer(1)
+        again = subset._read_shape(
+            self.multi_regions_geojson, bbox=(xmin, ymin, xmax, ymax)
+        )
+        assert len(subset._shape_cache._data) == 1
+        assert not again.geometry.geom_equals(poly.geometry).all()
+
+    def test_feature_filter(self):
+        ds = xr.open_dataset(self.nc_file)
+        regions = gpd.read_file(self.multi_regions_geojson)
+        name = regions.id.iloc[0]
+
+        sub = subset.subset_shape(
+            ds, self.multi_regions_geojson, feature_filter={"id": [name]}
+        )
+        expected = subset.subset_shape(ds, regions.iloc[[0]])
+        xr.testing.assert_identical(sub, expected)
+
+        sub = subset.subset_shape(ds, regions, feature_filter={"index": 0})
+        xr.testing.assert_identical(sub, expected)
+
+        with pytest.raises(ValueError):
+            subset.subset_shape(ds, regions, feature_filter={"name": "nowhere"})
+
+    def test_split_by_feature(self):
+        ds = xr.open_dataset(self.nc_file)
+        regions = gpd.read_file(self.multi_regions_geojson)
+        sub = subset.subset_shape(ds, regions)
+
+        subs = subset.subset_shape(ds, regions, split_by_feature=True)
+        assert list(subs) == list(regions.index)
+        assert sum(int(s.tas.notnull().sum()) for s in subs.values()) == int(
+            sub.tas.notnull().sum()
+        )
+        for name, s in subs.items():
+            # Each subset is cropped to its own feature
+            expected = subset.subset_shape(ds, regions.loc[[name]])
+            xr.testing.assert_identical(s, expected)
+
+    def test_keeps_unused_coords(self):
+        lon = np.arange(-19.5, 20)
+        lat = np.arange(-9.5, 10)
+        ds = xr.Dataset(
+            {"tas": (("lat", "lon"), np.ones((lat.size, lon.size)))},
+            coords={"lon": lon, "lat": lat, "height": 2.0, "member": ["r1", "r2"]},
+        )
+        ds.lon.attrs.update(standard_name="longitude", units="degrees_east")
+        ds.lat.attrs.update(standard_name="latitude", units="degrees_north")
+        ds = ds.assign_coords(orog=ds.tas * 100)
+        regions = gpd.GeoDataFrame(geometry=[box(0, 0, 10, 10)], crs=4326)
+
+        sub = subset.subset_shape(ds, regions)
+        # Coordinates not used by any data variable are kept, and left unmasked
+        assert {"height", "member", "orog"}.issubset(sub.coords)
+        xr.testing.assert_identical(sub.member, ds.member)
+        assert int(sub.tas.count()) == 100
+        assert sub.orog.notnull().all()
+
+    def test_split_by_feature_overlaps(self):
+        lon = np.arange(-19.5, 20)
+        lat = np.arange(-9.5, 10)
+        ds = xr.Dataset(
+            {"tas": (("lat", "lon"), np.ones((lat.size, lon.size)))},
+            coords={"lon": lon, "lat": lat},
+        )
+        ds.lon.attrs.update(standard_name="longitude", units="degrees_east")
+        ds.lat.attrs.update(standard_name="latitude", units="degrees_north")
+        # A country, one of its provinces, a partly overlapping and a separate region
+        regions = gpd.GeoDataFrame(
+            geometry=[
+                box(0, 0, 10, 10),
+                box(2, 2, 5, 5),
+                box(8, 8, 12, 10),
+                box(-15, -5, -10, 0),
+            ],
+            index=["country", "province", "border", "other"],
+            crs=4326,
+        )
+        assert subset._overlap_layers(regions) == [[0, 3], [1, 2]]
+
+        subs = subset.subset_shape(ds, regions, split_by_feature=True)
+        assert list(subs) == list(regions.index)
+        for name, s in subs.items():
+            # Shared cells are part of the subsets of all the features they are in
+            expected = subset.subset_shape(ds, regions.loc[[name]])
+            xr.testing.assert_identical(s.tas, expected.tas)
+        assert int(subs["country"].tas.count()) == 100
+        assert int(subs["province"].tas.count()) == 9
+
+    def test_check_overlaps(self):
+        poly = gpd.GeoDataFrame(
+            geometry=[
+                box(0, 0, 2, 2),
+                box(2, 0, 4, 2),  # Only touches the first one
+                box(3, 1, 5, 3),
+                box(0.5, 0.5, 1, 1),  # Within the first one
+                box(10, 10, 11, 11),
+            ],
+            index=list("abcde"),
+        )
+        assert subset._overlapping_pairs(poly) == [("a", "d"), ("b", "c")]
+
+        with pytest.warns(UserWarning, match=r"\(a, d\), \(b, c\)"):
+            subset._check_has_overlaps(poly)
+
+        with pytest.warns(None) as record:
+            subset._check_has_overlaps(poly.loc[["a", "b", "e"]])
+        assert not [q for q in record if "overlap" in str(q.message)]
+
+    def test_check_overlaps_tree_positions(self, monkeypatch):
+        import shapely.strtree
+
+        class PositionsTree:
+            """STRtree returning the positions of the geometries, as in shapely >= 2."""
+
+            def __init__(self, geoms):
+                self.geoms = geoms
+
+            def query(self, geom):
+                return np.array(
+                    [i for i, g in enumerate(self.geoms) if g.intersects(geom)],
+                    dtype=np.intp,
+                )
+
+        poly = gpd.GeoDataFrame(
+            geometry=[box(0, 0, 2, 2), box(2, 0, 4, 2), box(0.5, 0.5, 1, 1)],
+            index=list("abc"),
+        )
+        monkeypatch.setattr(shapely.strtree, "STRtree", PositionsTree)
+        assert subset._overlapping_pairs(poly) == [("a", "c")]
+
+    def test_input_unchanged(self):
+        ds = xr.open_dataset(self.nc_file, chunks={"time": 6})
+        ds["height_2"] = ds.height * 2
+        attrs = {v: dict(ds[v].attrs) for v in ds.variables}
+
+        sub = subset.subset_shape(ds, self.poslons_geojson)
+
+        # Only the variables on the grid are masked, lazily
+        assert sub.tas.chunks is not None
+        assert sub.time_bnds.identical(ds.time_bnds)
+        assert sub.height_2.identical(ds.height_2)
+        assert sub.tas.attrs["grid_mapping"] == "crs"
+        assert "crs" not in ds.variables
+        assert {v: ds[v].attrs for v in ds.variables} == attrs
+
 
 class TestDistance:
     def test_values(self):
@@ -820,6 +1253,95 @@ class TestDistance:
         i, j = np.unravel_index(k, da.data.shape)
         assert d[i, j] == d.min()
 
+    def test_haversine(self):
+        boston_lat = 42.0 + (15.0 / 60.0)
+        boston_lon = -71.0 - (7.0 / 60.0)
+        portland_lat = 45.0 + (31.0 / 60.0)
+        portland_lon = -123.0 - (41.0 / 60.0)
+
+        da = xr.DataArray(
+            0, coords={"lon": [boston_lon], "lat": [boston_lat]}, dims=["lon", "lat"]
+        )
+        d = subset.distance(da, lon=portland_lon, lat=portland_lat, method="haversine")
+        np.testing.assert_allclose(d, 4164074.239, rtol=5e-3)
+
+        with pytest.raises(ValueError):
+            subset.distance(da, lon=portland_lon, lat=portland_lat, method="vincenty")
+
+    @pytest.mark.slow
+    def test_benchmark_methods(self):
+        # 1M points grid
+        lon = np.linspace(-180, 180, 1000)
+        lat = np.linspace(-90, 90, 1000)
+        da = xr.Dataset(coords={"lon": lon, "lat": lat})
+
+        results = {
+            method: subset.distance(da, lon=-34, lat=56, method=method).squeeze("site")
+            for method in ["geodesic", "haversine"]
+        }
+
+        # The haversine formula approximates the geodesic distance
+        np.testing.assert_allclose(
+            results["haversine"], results["geodesic"], rtol=1e-2, atol=1
+        )
+        closest = {
+            method: {dim: int(i) for dim, i in d.argmin(dim=["lon", "lat"]).items()}
+            for method, d in results.items()
+        }
+        assert closest["haversine"] == closest["geodesic"]
+
+    def test_memory_limit(self):
+        lon = np.linspace(-180, 180, 20)
+        lat = np.linspace(-90, 90, 30)
+        da = xr.DataArray(
+            np.random.rand(lon.size, lat.size),
+            dims=["lon", "lat"],
+            coords={"lon": lon, "lat": lat},
+        )
+        sites_lon = np.linspace(-100, 100, 7)
+        sites_lat = np.linspace(-60, 60, 7)
+
+        d = subset.distance(da, lon=sites_lon, lat=sites_lat)
+        # Small enough to compute a single site per block
+        d_blocked = subset.distance(
+            da, lon=sites_lon, lat=sites_lat, memory_limit="1KiB"
+        )
+        # The distance field is lazy, chunked by blocks of sites
+        assert d_blocked.chunks == ((20,), (30,), (1,) * 7)
+        assert d_blocked.dims == d.dims
+        np.testing.assert_array_equal(d, d_blocked)
+
+        # Two sites per block
+        d_blocked = subset.distance(
+            da, lon=sites_lon, lat=sites_lat, memory_limit=2 * 7 * 8 * 600
+        )
+        assert d_blocked.chunks[-1] == (2, 2, 2, 1)
+        np.testing.assert_array_equal(d, d_blocked)
+
+    def test_argmin(self):
+        lon = np.linspace(-180, 180, 20)
+        lat = np.linspace(-90, 90, 30)
+        da = xr.DataArray(
+            np.random.rand(lon.size, lat.size),
+            dims=["lon", "lat"],
+            coords={"lon": lon, "lat": lat},
+        )
+        sites_lon = np.linspace(-100, 100, 7)
+        sites_lat = np.linspace(-60, 60, 7)
+
+        d = subset.distance(da, lon=sites_lon, lat=sites_lat)
+        out = subset.distance(
+            da, lon=sites_lon, lat=sites_lat, argmin=True, memory_limit=10000
+        )
+        assert set(out.data_vars) == {"distance", "index"}
+        assert out.distance.units == "m"
+
+        for k in range(sites_lon.size):
+            dk = d.isel(site=k)
+            i, j = np.unravel_index(int(out.index[k]), dk.shape)
+            assert dk[i, j] == dk.min()
+            np.testing.assert_allclose(out.distance[k], dk.min())
+
 
 class TestSubsetLevel:
     nc_plev = os.path.join(
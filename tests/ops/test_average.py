@@ -0,0 +1,133 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import xarray as xr
+from shapely.geometry import box
+
+from clisops.core import average as core_average
+from clisops.core import subset_bbox, subset_shape
+from clisops.exceptions import InvalidParameterValue
+from clisops.ops.average import average_over_dims
+
+from .._common import CMIP5_TAS, CMIP5_TAS_FILE
+
+
+def _load_ds(fpath):
+    return xr.open_mfdataset(fpath, use_cftime=True, combine="by_coords")
+
+
+def test_average_time(tmpdir):
+    """ Tests averaging over time, written to a single file."""
+    result = average_over_dims(
+        CMIP5_TAS,
+        dims=["time"],
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="standard",
+    )
+    assert [os.path.basename(r) for r in result] == [
+        "tas_mon_HadGEM2-ES_rcp85_r1i1p1.nc"
+    ]
+
+    ds = _load_ds(CMIP5_TAS)
+    with xr.open_dataset(result[0]) as avg:
+        assert "time" not in avg.dims
+        np.testing.assert_allclose(avg.tas, ds.tas.mean(dim="time"), rtol=1e-6)
+        assert avg.tas.attrs == ds.tas.attrs
+
+
+def test_average_lat_lon(tmpdir):
+    """ Tests averaging over lat and lon, keeping time."""
+    result = average_over_dims(
+        CMIP5_TAS_FILE,
+        dims="latitude,longitude",
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="simple",
+    )
+    assert os.path.basename(result[0]) == "output_001.nc"
+
+    with xr.open_dataset(result[0], use_cftime=True) as avg:
+        assert avg.tas.dims == ("time",)
+        assert "time_bnds" in avg
+        assert "lat_bnds" not in avg
+
+
+def test_average_xarray_output():
+    ds = _load_ds(CMIP5_TAS_FILE)
+    result = average_over_dims(ds, dims=["time"], output_type="xarray")
+
+    # Nothing is computed until asked
+    assert result[0].tas.chunks is not None
+    xr.testing.assert_allclose(result[0].tas, ds.tas.mean(dim="time"))
+
+
+def test_average_undetected_dims():
+    ds = _load_ds(CMIP5_TAS_FILE)
+
+    with pytest.raises(ValueError):
+        average_over_dims(ds, dims=["level"], output_type="xarray")
+
+    result = average_over_dims(
+        ds, dims=["time", "level"], ignore_undetected_dims=True, output_type="xarray"
+    )
+    assert "time" not in result[0].dims
+
+
+def test_average_unknown_dim():
+    ds = _load_ds(CMIP5_TAS_FILE)
+
+    with pytest.raises(ValueError):
+        average_over_dims(ds, dims=["height"], output_type="xarray")
+
+    with pytest.raises(ValueError):
+        average_over_dims(ds, dims=None, output_type="xarray")
+
+
+def test_average_subset(tmpdir):
+    """ Tests subsetting and averaging in one pass, writing only the average."""
+    result = average_over_dims(
+        CMIP5_TAS,
+        dims=["latitude", "longitude"],
+        time=("2005-01-01T00:00:00", "2010-12-30T00:00:00"),
+        area=(0.0, 10.0, 60.0, 50.0),
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="simple",
+    )
+    assert len(os.listdir(tmpdir)) == len(result)
+
+    ds = subset_bbox(
+        _load_ds(CMIP5_TAS),
+        lon_bnds=(0.0, 60.0),
+        lat_bnds=(10.0, 50.0),
+        start_date="2005-01-01T00:00:00",
+        end_date="2010-12-30T00:00:00",
+    )
+    expected = core_average.average_over_dims(ds, dims=["latitude", "longitude"])
+    with xr.open_mfdataset(result, use_cftime=True, combine="by_coords") as avg:
+        np.testing.assert_allclose(avg.tas, expected.tas, rtol=1e-6)
+
+
+def test_average_subset_shape():
+    ds = _load_ds(CMIP5_TAS_FILE)
+    poly = gpd.GeoDataFrame(geometry=[box(0.0, 10.0, 60.0, 50.0)], crs=4326)
+
+    result = average_over_dims(
+        ds, dims=["latitude", "longitude"], shape=poly, output_type="xarray"
+    )
+    expected = core_average.average_over_dims(
+        subset_shape(ds, poly), dims=["latitude", "longitude"]
+    )
+    xr.testing.assert_allclose(result[0].tas, expected.tas)
+
+    with pytest.raises(InvalidParameterValue):
+        average_over_dims(
+            ds,
+            dims=["time"],
+            area=(0.0, 10.0, 60.0, 50.0),
+            shape=poly,
+            output_type="xarray",
+        )
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from clisops.exceptions import InvalidParameterValue
+from clisops.ops import pool
+from clisops.ops.pool import SubsetPool
+from clisops.ops.subset import subset
+
+from .._common import CMIP5_TAS_FILE
+
+
+@pytest.fixture
+def worker_cache(monkeypatch):
+    """Set up the dataset cache of a worker in the current process."""
+    monkeypatch.setattr(pool, "_datasets", None)
+    pool._init_worker(cache_size=1)
+    return pool._datasets
+
+
+def _write_ds(path, value=0.0):
+    time = pd.date_range("2000-01-01", periods=4, freq="D")
+    ds = xr.Dataset({"tas": (("time",), np.full(4, value))}, coords={"time": time})
+    ds.to_netcdf(path)
+    return str(path)
+
+
+def test_open_dataset_reuses_handles(worker_cache, tmpdir):
+    path = _write_ds(tmpdir.join("a.nc"))
+
+    ds = pool._open_dataset(path)
+    assert pool._open_dataset(path) is ds
+    assert pool._open_dataset([path]) is ds
+
+
+def test_open_dataset_closes_evicted(worker_cache, tmpdir, monkeypatch):
+    path_a = _write_ds(tmpdir.join("a.nc"))
+    path_b = _write_ds(tmpdir.join("b.nc"))
+
+    closed = []
+    monkeypatch.setattr(worker_cache, "on_evict", closed.append)
+
+    ds_a = pool._open_dataset(path_a)
+    ds_b = pool._open_dataset(path_b)
+    assert closed == [ds_a]
+    assert pool._open_dataset(path_b) is ds_b
+
+
+def test_close_datasets(tmpdir, monkeypatch):
+    monkeypatch.setattr(pool, "_datasets", None)
+    pool._init_worker(cache_size=2)
+    path_a = _write_ds(tmpdir.join("a.nc"))
+    path_b = _write_ds(tmpdir.join("b.nc"))
+
+    closed = []
+    monkeypatch.setattr(pool._datasets, "on_evict", closed.append)
+
+    ds_a = pool._open_dataset(path_a)
+    ds_b = pool._open_dataset(path_b)
+    pool._close_datasets(pool._datasets)
+    assert closed == [ds_a, ds_b]
+    assert pool._datasets.get(pool._dataset_key(path_a)) is None
+
+
+def test_open_dataset_rewritten_file(worker_cache, tmpdir):
+    path = _write_ds(tmpdir.join("a.nc"))
+    ds = pool._open_dataset(path)
+    ds.close()
+
+    os.utime(path, (0, 0))
+    assert pool._open_dataset(path) is not ds
+
+
+def test_pool_invalid_requests():
+    with SubsetPool(processes=1) as p:
+        with pytest.raises(InvalidParameterValue):
+            p.submit(xr.Dataset())
+        with pytest.raises(InvalidParameterValue):
+            p.submit(CMIP5_TAS_FILE, output_type="xarray")
+        with pytest.raises(InvalidParameterValue):
+            p.map([{"time": ("2005-01-01", "2005-12-30")}])
+
+
+def test_pool_subset(tmpdir):
+    time = ("2005-01-01T00:00:00", "2020-12-30T00:00:00")
+    expected = subset(CMIP5_TAS_FILE, time=time, output_dir=tmpdir.mkdir("expected"))
+
+    out_dir = str(tmpdir.mkdir("pool"))
+    with SubsetPool(processes=2) as p:
+        future = p.submit(
+            CMIP5_TAS_FILE, time=time, output_dir=str(tmpdir.mkdir("submit"))
+        )
+        results = p.map(
+            [
+                {"ds": CMIP5_TAS_FILE, "time": time, "output_dir": out_dir},
+                {
+                    "ds": CMIP5_TAS_FILE,
+                    "area": (0, -10, 120, 40),
+                    "output_dir": out_dir,
+                },
+            ]
+        )
+        result = future.get()
+
+    assert len(results) == 2
+    assert [os.path.basename(path) for path in result] == [
+        os.path.basename(path) for path in results[0]
+    ]
+    assert {os.path.dirname(path) for path in results[0]} == {out_dir}
+    with xr.open_dataset(result[0], use_cftime=True) as out, xr.open_dataset(
+        expected[0], use_cftime=True
+    ) as ref:
+        xr.testing.assert_identical(out, ref)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+from clisops.core.regrid import regular_grid
+from clisops.ops.regrid import regrid
+
+from .._common import CMIP5_TAS_FILE
+
+
+def _load_ds(fpath):
+    return xr.open_mfdataset(fpath, use_cftime=True, combine="by_coords")
+
+
+def test_regrid_resolution(tmpdir):
+    """ Tests regridding to a global regular grid given by its resolution."""
+    weights_dir = os.path.join(tmpdir, "weights")
+    result = regrid(
+        CMIP5_TAS_FILE,
+        grid=5.0,
+        method="conservative",
+        weights_dir=weights_dir,
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="simple",
+    )
+    assert len(os.listdir(weights_dir)) == 1
+
+    with xr.open_mfdataset(result, use_cftime=True, combine="by_coords") as out:
+        assert out.tas.shape[1:] == (36, 72)
+        np.testing.assert_array_equal(out.lat, regular_grid(5.0).lat)
+        assert "lat_bnds" in out
+
+
+def test_regrid_methods():
+    ds = _load_ds(CMIP5_TAS_FILE).isel(time=slice(0, 3))
+    grid = regular_grid(10.0)
+
+    for method in ["conservative", "bilinear", "nearest"]:
+        out = regrid(ds, grid, method=method, output_type="xarray")[0]
+        assert out.tas.dims == ("time", "lat", "lon")
+        assert out.tas.attrs == ds.tas.attrs
+        # Global means stay close whatever the method
+        weights = np.cos(np.deg2rad(out.lat))
+        np.testing.assert_allclose(
+            out.tas.weighted(weights).mean(dim=["lat", "lon"]),
+            ds.tas.weighted(np.cos(np.deg2rad(ds.lat))).mean(dim=["lat", "lon"]),
+            rtol=1e-2,
+        )
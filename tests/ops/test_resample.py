@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+from clisops.ops.resample import climatology, resample
+
+from .._common import CMIP5_TAS, CMIP5_TAS_FILE
+
+
+def _load_ds(fpath):
+    return xr.open_mfdataset(fpath, use_cftime=True, combine="by_coords")
+
+
+def test_resample_year(tmpdir):
+    """ Tests annual means of monthly data, on a 360-day calendar."""
+    result = resample(
+        CMIP5_TAS_FILE,
+        freq="year",
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="simple",
+    )
+    assert os.path.basename(result[0]) == "output_001.nc"
+
+    ds = _load_ds(CMIP5_TAS_FILE)
+    with xr.open_mfdataset(result, use_cftime=True, combine="by_coords") as out:
+        np.testing.assert_allclose(
+            out.tas, ds.tas.groupby("time.year").mean(), rtol=1e-6
+        )
+
+
+def test_climatology_subset():
+    result = climatology(
+        CMIP5_TAS,
+        freq="month",
+        time=("2005-01-01T00:00:00", "2010-12-30T00:00:00"),
+        output_type="xarray",
+    )
+    out = result[0]
+    assert out.tas.dims == ("month", "lat", "lon")
+    assert list(out.month.values) == list(range(1, 13))
+
+    ds = _load_ds(CMIP5_TAS).sel(time=slice("2005-01-01", "2010-12-30"))
+    np.testing.assert_allclose(out.tas, ds.tas.groupby("time.month").mean(), rtol=1e-6)
@@ -2,12 +2,14 @@ import os
 import sys
 from unittest.mock import Mock
 
+import geopandas as gpd
 import numpy as np
 import pytest
 import xarray as xr
 from roocs_utils.exceptions import InvalidParameterValue, MissingParameterValue
 from roocs_utils.parameter import area_parameter, time_parameter
 from roocs_utils.utils.common import parse_size
+from shapely.geometry import box
 
 import clisops
 from clisops import CONFIG
@@ -334,3 +336,45 @@ def test_subset_level(tmpdir):
     result3 = subset(ds=CMIP6_O3, level="101/-23.234", output_type="xarray")
 
     np.testing.assert_array_equal(result3[0].o3.values, result2[0].o3.values)
+
+
+def test_subset_shape():
+    """ Tests clisops subset function with a shape."""
+    poly = gpd.GeoDataFrame(geometry=[box(0.0, 10.0, 60.0, 50.0)], crs=4326)
+    result = subset(ds=CMIP5_TAS_FILE, shape=poly, output_type="xarray")
+
+    assert result[0].lon.size > 0 and result[0].lat.size > 0
+    assert ((result[0].lon >= 0.0) & (result[0].lon <= 60.0)).all()
+    assert ((result[0].lat >= 10.0) & (result[0].lat <= 50.0)).all()
+
+
+def test_subset_split_by_feature(tmpdir):
+    """ Tests clisops subset function writing one subset per feature."""
+    poly = gpd.GeoDataFrame(
+        geometry=[box(0.0, 10.0, 60.0, 50.0), box(20.0, 20.0, 30.0, 30.0)],
+        index=["region", "nested"],
+        crs=4326,
+    )
+    result = subset(
+        ds=CMIP5_TAS_FILE,
+        shape=poly,
+        split_by_feature=True,
+        output_dir=tmpdir,
+        output_type="nc",
+        file_namer="simple",
+    )
+    assert [os.path.relpath(path, tmpdir) for path in result] == [
+        os.path.join("region", "output_001.nc"),
+        os.path.join("nested", "output_001.nc"),
+    ]
+
+    # The cells of the nested feature are part of both subsets
+    region = _load_ds(result[0]).tas
+    nested = _load_ds(result[1]).tas
+    assert int(nested.count()) > 0
+    xr.testing.assert_identical(
+        region.sel(lat=nested.lat, lon=nested.lon).where(nested.notnull()), nested
+    )
+
+    with pytest.raises(clisops.exceptions.InvalidParameterValue):
+        subset(ds=CMIP5_TAS_FILE, split_by_feature=True, output_type="xarray")
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from clisops.utils.cache_utils import LRUCache, hash_arrays, write_atomic
+
+
+def test_lru_cache():
+    evicted = []
+    cache = LRUCache(maxsize=2, on_evict=evicted.append)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is the least recently used
+    cache.put("c", 3)
+    assert evicted == [2]
+    assert cache.get("b") is None
+
+    cache.evict_all()
+    assert evicted == [2, 1, 3]
+    assert cache.get("a") is None
+
+
+def test_hash_arrays():
+    x = np.arange(4.0)
+    assert hash_arrays(x) == hash_arrays(x.copy())
+    assert hash_arrays(x) != hash_arrays(x.astype(np.float32))
+    assert hash_arrays(x) != hash_arrays(x.reshape(2, 2))
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "key.npz"
+
+    def write(value):
+        write_atomic(path, lambda f: np.savez(f, mask=np.full(100_000, value)))
+
+    # Threads of the same process writing the same key
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(write, range(16)))
+
+    with np.load(path) as stored:
+        assert np.unique(stored["mask"]).size == 1
+    assert [p.name for p in tmp_path.iterdir()] == ["key.npz"]
+
+    def fail(f):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(tmp_path / "other.npz", fail)
+    assert [p.name for p in tmp_path.iterdir()] == ["key.npz"]
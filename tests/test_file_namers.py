@@ -1,9 +1,12 @@
+from unittest.mock import patch
+
+import numpy as np
 import pytest
 import xarray as xr
 
 from clisops import CONFIG
 from clisops.ops.subset import subset
-from clisops.utils.file_namers import get_file_namer
+from clisops.utils.file_namers import StandardFileNamer, get_file_namer
 
 from ._common import CMIP5_TAS
 
@@ -185,3 +188,108 @@ def test_StandardFileNamer_c3s_cordex_use_default_attr_names():
     for ds, expected in checks:
         resp = s.get_file_name(ds)
         assert resp == expected
+
+
+@pytest.fixture
+def cmip6_ds(monkeypatch):
+    monkeypatch.setitem(
+        CONFIG["project:cmip6"],
+        "file_name_template",
+        "{__derive__var_id}_{table_id}_{source_id}_{grid_label}_{__derive__time_range}.{__derive__extension}",
+    )
+    time = xr.cftime_range("2000-01-16", periods=24, freq="MS", calendar="360_day")
+    return xr.Dataset(
+        {"tas": (("time",), np.ones(time.size))},
+        coords={"time": time},
+        attrs={"mip_era": "CMIP6", "source_id": "M", "table_id": "Amon"},
+    )
+
+
+def test_StandardFileNamer_time_range(cmip6_ds):
+    s = get_file_namer("standard")()
+
+    assert s.get_file_name(cmip6_ds) == "tas_Amon_M_no-grid_20000201-20020101.nc"
+    assert (
+        s.get_file_name(cmip6_ds, time_range=("2000-02-01", "2000-06-01T00:00:00"))
+        == "tas_Amon_M_no-grid_20000201-20000601.nc"
+    )
+    assert (
+        s.get_file_name(cmip6_ds.mean(dim="time", keep_attrs=True))
+        == "tas_Amon_M_no-grid.nc"
+    )
+
+
+def test_StandardFileNamer_sorted_times(cmip6_ds):
+    s = get_file_namer("standard")()
+
+    # Times are sorted, so only the ends of the time index are used
+    with patch.object(
+        cmip6_ds.indexes["time"].__class__, "max", side_effect=AssertionError
+    ):
+        assert s.get_file_name(cmip6_ds, fmt="zarr").endswith(".zarr")
+    assert "cmip6" in StandardFileNamer._templates
+
+
+def test_SimpleFileNamer_index():
+    s = get_file_namer("simple")()
+
+    assert s.get_file_name("my.stuff", "netcdf", index=2) == "output_003.nc"
+    assert s.get_file_name("other", "netcdf", index=0) == "output_001.nc"
+
+
+def test_DeterministicFileNamer(cmip6_ds):
+    request = ("subset", "/path/to/tas_*.nc", ("2000-01-01", "2001-12-30"))
+    s = get_file_namer("deterministic")(request=request)
+
+    name = s.get_file_name(
+        cmip6_ds, fmt="nc", time_range=("2000-02-01", "2000-06-01"), index=1
+    )
+    assert name.startswith("output_") and name.endswith("_002_20000201-20000601.nc")
+
+    # Names don't depend on the order of the calls, nor on the namer instance
+    other = get_file_namer("deterministic")(request=request)
+    other.get_file_name(cmip6_ds, fmt="nc", index=0)
+    assert (
+        other.get_file_name(
+            cmip6_ds, fmt="nc", time_range=("2000-02-01", "2000-06-01"), index=1
+        )
+        == name
+    )
+
+    # Different requests give different names
+    s = get_file_namer("deterministic")(request=request + ("zarr",))
+    assert s.get_file_name(
+        cmip6_ds, fmt="nc", time_range=("2000-02-01", "2000-06-01"), index=1
+    ) != name
+
+    assert s.get_file_name(cmip6_ds.mean(dim="time"), fmt="zarr").endswith("_001.zarr")
+
+
+def test_DeterministicFileNamer_lazy_request():
+    import dask.array
+
+    def fail(block):
+        raise AssertionError("data of the request was computed")
+
+    def make_ds(offset=0):
+        data = dask.array.ones((4, 3), chunks=2).map_blocks(fail, dtype=float) + offset
+        return xr.Dataset(
+            {"tas": (("time", "lat"), data)},
+            coords={"lat": [0.0, 1.0, 2.0]},
+            attrs={"source_id": "model"},
+        )
+
+    def request_hash(ds):
+        return get_file_namer("deterministic")(request=("subset", ds))._request_hash
+
+    # The data of lazy variables is neither computed nor hashed
+    assert request_hash(make_ds()) == request_hash(make_ds())
+    assert request_hash(make_ds()) != request_hash(make_ds(offset=1))
+
+    ds = make_ds()
+    assert request_hash(ds) != request_hash(ds.assign_attrs(source_id="other"))
+    assert request_hash(ds) != request_hash(ds.assign_coords(lat=[0.0, 1.0, 3.0]))
+
+    # Variables in memory are identified by their values
+    ds = xr.Dataset({"tas": ("lat", np.zeros(3))})
+    assert request_hash(ds) != request_hash(ds + 1)
@@ -0,0 +1,85 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Heavy dependencies only needed by some operations, imported when first used
+LAZY_MODULES = ["geopandas", "shapely", "pyproj", "scipy.spatial", "dask.array"]
+
+
+def _loaded_modules(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], stdout=subprocess.PIPE, check=True
+    )
+    return set(result.stdout.decode().split())
+
+
+@pytest.mark.parametrize("package", ["clisops", "clisops.core", "clisops.ops"])
+def test_import_is_lazy(package):
+    modules = _loaded_modules(f"import {package}")
+    assert not modules.intersection(LAZY_MODULES)
+
+
+def test_import_clisops_does_not_read_config():
+    modules = _loaded_modules("import clisops")
+    assert "roocs_utils" not in modules
+    assert "xarray" not in modules
+
+
+def test_import_clisops_sets_environment():
+    env = {k: v for k, v in os.environ.items() if k != "OMP_NUM_THREADS"}
+    code = (
+        "import os, sys; import clisops; "
+        "print(os.environ.get('OMP_NUM_THREADS'), 'roocs_utils' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], stdout=subprocess.PIPE, env=env, check=True
+    )
+    assert result.stdout.decode().split() == ["1", "False"]
+
+
+def test_chunk_memory_limit_deprecated():
+    import clisops
+
+    with pytest.warns(DeprecationWarning):
+        assert clisops.chunk_memory_limit == clisops.get_chunk_memory_limit()
+    with pytest.raises(AttributeError):
+        clisops.unknown_setting
+
+
+def test_config_is_read_on_first_access():
+    from clisops import CONFIG, get_chunk_memory_limit
+
+    assert "clisops:read" in CONFIG
+    assert get_chunk_memory_limit() == CONFIG["clisops:read"].get(
+        "chunk_memory_limit"
+    )
+
+
+@pytest.mark.slow
+def test_import_time():
+    code = (
+        "import time; start = time.perf_counter(); import clisops.core; "
+        "print(time.perf_counter() - start)"
+    )
+    # Best of a few runs, each in a fresh interpreter
+    times = []
+    for _ in range(3):
+        result = subprocess.run(
+            [sys.executable, "-c", code], stdout=subprocess.PIPE, check=True
+        )
+        times.append(float(result.stdout))
+    assert min(times) < 5
+
+
+@pytest.mark.parametrize(
+    "module", ["average", "regions", "regrid", "resample", "subset"]
+)
+def test_core_modules_not_shadowed(module):
+    import clisops.core
+
+    submodule = importlib.import_module(f"clisops.core.{module}")
+    assert getattr(clisops.core, module) is submodule
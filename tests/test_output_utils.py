@@ -1,6 +1,19 @@
+import os
+
+import dask
+import numpy as np
+import pytest
 import xarray as xr
 
-from clisops.utils.output_utils import get_time_slices
+from clisops import CONFIG
+from clisops.utils import output_utils
+from clisops.utils.file_namers import SimpleFileNamer, StandardFileNamer
+from clisops.utils.output_utils import (
+    get_chunked_input,
+    get_outputs,
+    get_split_outputs,
+    get_time_slices,
+)
 
 from ._common import CMIP5_RH, CMIP5_TAS
 
@@ -68,3 +81,97 @@ def test_get_time_slices_multiple_slices():
 
         if second:
             assert resp[1] == second
+
+
+def test_get_outputs(tmp_path):
+    tas = _open(CMIP5_TAS)
+    datasets = [tas.isel(lat=slice(0, 10)), tas.isel(lat=slice(10, 20))]
+
+    paths = get_outputs(datasets, "netcdf", str(tmp_path), SimpleFileNamer())
+    assert len(paths) == 2
+    for path, ds in zip(paths, datasets):
+        with xr.open_dataset(path, use_cftime=True) as written:
+            xr.testing.assert_allclose(written.tas, ds.tas)
+
+    outputs = get_outputs(datasets, "xarray", None, SimpleFileNamer())
+    assert all(out is ds for out, ds in zip(outputs, datasets))
+
+    # Both datasets would get the same standard name
+    with pytest.raises(ValueError):
+        get_outputs(datasets, "netcdf", str(tmp_path), StandardFileNamer())
+
+
+def _synthetic_datasets():
+    time = xr.cftime_range("2000-01-01", periods=4, freq="D")
+    ds = xr.Dataset(
+        {"tas": (("time", "lat"), np.arange(8.0).reshape(4, 2))},
+        coords={"time": time, "lat": [0.0, 1.0]},
+    ).chunk({"time": 2})
+    return [ds.isel(lat=[0]), ds.isel(lat=[1])]
+
+
+def test_get_outputs_single_compute(tmp_path, monkeypatch):
+    datasets = _synthetic_datasets()
+
+    calls = []
+    compute = dask.compute
+
+    def counting_compute(*args, **kwargs):
+        calls.append(len(args))
+        return compute(*args, **kwargs)
+
+    monkeypatch.setattr(output_utils.dask, "compute", counting_compute)
+    paths = get_outputs(datasets, "netcdf", str(tmp_path), SimpleFileNamer())
+
+    # All the outputs are written by one computation, with unique names
+    assert calls == [2]
+    assert len(set(paths)) == 2
+    for path, ds in zip(paths, datasets):
+        with xr.open_dataset(path, use_cftime=True) as written:
+            xr.testing.assert_allclose(written.tas, ds.tas)
+
+
+def test_get_outputs_directories(tmp_path):
+    datasets = _synthetic_datasets()
+    dirs = [str(tmp_path.joinpath(name)) for name in ["a", "b"]]
+    for path in dirs:
+        os.makedirs(path)
+
+    # The same names in different directories
+    paths = get_outputs(datasets, "netcdf", dirs, SimpleFileNamer(), indices=[0, 0])
+    assert paths == [os.path.join(path, "output_001.nc") for path in dirs]
+
+
+def test_get_outputs_name_collision(tmp_path):
+    datasets = _synthetic_datasets()
+
+    with pytest.raises(ValueError, match="not unique"):
+        get_outputs(
+            datasets, "netcdf", str(tmp_path), SimpleFileNamer(), indices=[0, 0]
+        )
+    assert not list(tmp_path.iterdir())
+
+
+def test_get_chunked_input(monkeypatch):
+    """ Tests that the input is chunked along time within the chunk memory limit."""
+    monkeypatch.setitem(CONFIG["clisops:read"], "chunk_memory_limit", "1MiB")
+    ds = get_chunked_input(CMIP5_TAS)
+
+    assert len(ds.tas.chunks[0]) > 1
+    assert max(ds.tas.chunks[0]) * ds.tas.isel(time=0).nbytes <= 2 ** 20
+
+
+def test_get_split_outputs(tmp_path):
+    ds = _synthetic_datasets()[0]
+
+    paths = get_split_outputs(
+        ds, "netcdf", str(tmp_path), "time:auto", SimpleFileNamer()
+    )
+    assert paths == [str(tmp_path.joinpath("output_001.nc"))]
+
+    # Results without time are written to a single output
+    outputs = get_split_outputs(
+        ds.mean(dim="time"), "xarray", None, "time:auto", SimpleFileNamer()
+    )
+    assert len(outputs) == 1
+    xr.testing.assert_allclose(outputs[0].tas, ds.tas.mean(dim="time"))
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from clisops.utils.sparse_utils import mask_to_sparse, reduce_cells
+
+
+def test_mask_to_sparse():
+    cells = mask_to_sparse(np.array([[0, -1], [1, 0]]), n_regions=3)
+    assert cells.shape == (3, 4)
+    np.testing.assert_array_equal(
+        cells.toarray(), [[1, 0, 0, 1], [0, 0, 1, 0], [0] * 4]
+    )
+
+
+@pytest.mark.parametrize(
+    "how,expected",
+    [
+        ("sum", [[4.0, 3.0], [9.0, 6.0]]),
+        ("mean", [[2.0, 3.0], [4.5, 6.0]]),
+        ("min", [[1.0, 3.0], [4.0, 6.0]]),
+        ("max", [[3.0, 3.0], [5.0, 6.0]]),
+    ],
+)
+def test_reduce_cells(how, expected):
+    values = np.array([[1.0, 3.0, np.nan, 3.0], [4.0, 5.0, 6.0, np.nan]])
+    cells = mask_to_sparse(np.array([0, 0, 1, 1])).astype(float)
+    # NaN values are skipped
+    np.testing.assert_allclose(reduce_cells(values, cells, how), expected)